@@ -0,0 +1,121 @@
+"""Micro-benchmark: single-pass lxml extractor vs. the original BeautifulSoup one.
+
+    python bench/bench_extract.py                    # pages in bench/fixtures
+    python bench/bench_extract.py --pages DIR        # any directory of saved .html pages
+    python bench/bench_extract.py --from-cache       # every page in the scraper's HTTP cache
+
+Both extractors must return identical dicts for every page; the script exits
+non-zero if they ever differ. Needs beautifulsoup4, which the scraper itself
+no longer uses.
+"""
+import os, re, sys, json, glob, time, sqlite3, argparse, statistics
+
+from bs4 import BeautifulSoup
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+FIXTURES = os.path.join(ROOT, "bench", "fixtures")
+
+def extract_product_fields_soup(html: str, url: str):
+    # The scraper's original BeautifulSoup extractor, kept here as the reference.
+    soup = BeautifulSoup(html, "lxml")
+
+    title = soup.find("title").get_text(strip=True) if soup.find("title") else url
+    # meta description
+    desc = ""
+    md = soup.find("meta", attrs={"name": "description"})
+    if md and md.get("content"):
+        desc = md["content"]
+
+    # Try LD+JSON Product
+    how_to_use, ingredients = "", ""
+    bullets = []
+
+    for script in soup.find_all("script", attrs={"type":"application/ld+json"}):
+        try:
+            data = json.loads(script.string or "{}")
+            if isinstance(data, dict) and data.get("@type") == "Product":
+                ddesc = data.get("description") or ""
+                if ddesc and not desc:
+                    desc = ddesc
+                # nothing else standardized here
+        except Exception:
+            continue
+
+    # Try to find sections by headings
+    def section_text(label: str) -> str:
+        # look for heading containing label
+        for hx in soup.find_all(re.compile("^h[1-6]$")):
+            if label.lower() in hx.get_text(" ", strip=True).lower():
+                frag = []
+                for sib in hx.find_all_next(["p","li"], limit=8):
+                    t = scraper.clean_text(sib.get_text(" ", strip=True))
+                    if t: frag.append(t)
+                return " ".join(frag)[:500]
+        return ""
+
+    how_to_use = section_text("How to use") or section_text("How To Use")
+    ingredients = section_text("Ingredients")
+
+    # Collect a few bullets if present (li items near details)
+    for li in soup.find_all("li"):
+        txt = scraper.clean_text(li.get_text(" ", strip=True))
+        if txt and len(bullets) < 8 and 8 <= len(txt) <= 180:
+            bullets.append(txt)
+
+    return {
+        "id": url,
+        "url": url,
+        "title": title,
+        "description": desc,
+        "how_to_use": how_to_use,
+        "ingredients": ingredients,
+        "bullets": bullets,
+        "tags": [],
+    }
+
+def load_pages(args):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(args.pages, "*.html"))):
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append((os.path.basename(path), f.read()))
+    if args.from_cache:
+        db = sqlite3.connect(scraper.HTTP_CACHE_FILE)
+        for url, body in db.execute("SELECT url, body FROM pages WHERE url LIKE '%/products/%'"):
+            pages.append((url, body))
+    return pages
+
+def per_page_us(fn, html, url, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(html, url)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1e6
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", default=FIXTURES)
+    ap.add_argument("--from-cache", action="store_true")
+    ap.add_argument("-n", "--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    if not args.from_cache:
+        os.environ.setdefault("HTTP_CACHE_FILE", "")  # don't create a cache just to benchmark
+    sys.path.insert(0, os.path.join(ROOT, "scraper"))
+    import scrape_ortahaus as scraper
+
+    pages = load_pages(args)
+    if not pages:
+        sys.exit("no pages to benchmark")
+
+    total_old = total_new = 0.0
+    print(f"{'page':<48} {'bytes':>8} {'soup us':>10} {'lxml us':>10} {'speedup':>8}")
+    for name, html in pages:
+        if scraper.extract_product_fields(html, name) != extract_product_fields_soup(html, name):
+            sys.exit(f"extractors disagree on {name}")
+        old = per_page_us(extract_product_fields_soup, html, name, args.repeat)
+        new = per_page_us(scraper.extract_product_fields, html, name, args.repeat)
+        total_old += old
+        total_new += new
+        print(f"{name[-48:]:<48} {len(html):>8} {old:>10.0f} {new:>10.0f} {old / new:>7.1f}x")
+    print(f"{'mean per page':<48} {'':>8} {total_old / len(pages):>10.0f} {total_new / len(pages):>10.0f} {total_old / total_new:>7.1f}x")
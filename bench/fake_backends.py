@@ -0,0 +1,185 @@
+"""Offline stand-ins for the OpenAI and Pinecone HTTP APIs, for load tests and local runs.
+
+    python bench/fake_backends.py [--port 8100] [--latency-ms 40] [--jitter-ms 20] [--error-rate 0.01]
+
+then point the server or indexer at it:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 PINECONE_HOST=http://127.0.0.1:8100 \\
+    OPENAI_API_KEY=fake PINECONE_API_KEY=fake uvicorn server.app:app
+
+Embeddings are deterministic: each word maps to a fixed random unit vector and a
+text embeds to the normalized sum, so texts sharing words score close together and
+repeated runs give identical results. The Pinecone side keeps upserted vectors in
+memory per namespace and answers queries with exact cosine search. Every endpoint
+sleeps `latency ± jitter` ms and fails `error-rate` of requests (429 or 500).
+"""
+import os, re, json, time, random, asyncio, hashlib, argparse
+from functools import lru_cache
+from typing import Any, Dict, List
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FAKE_EMBED_DIM = int(os.getenv("FAKE_EMBED_DIM", "1536"))
+FAKE_LATENCY_MS = float(os.getenv("FAKE_LATENCY_MS", "40"))
+FAKE_JITTER_MS = float(os.getenv("FAKE_JITTER_MS", "20"))
+FAKE_ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+FAKE_TOKEN_MS = float(os.getenv("FAKE_TOKEN_MS", "15"))
+FAKE_SEED = int(os.getenv("FAKE_SEED", "0"))
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+FAKE_REPLY = ("It works with your hair type without weighing it down, and a small amount "
+              "goes a long way. Apply to damp hair and style as usual.")
+
+app = FastAPI(title="Fake OpenAI + Pinecone")
+rng = random.Random(FAKE_SEED)
+counts: Dict[str, int] = {}
+# namespace -> id -> (unit vector, metadata)
+vectors: Dict[str, Dict[str, Any]] = {}
+
+# ---------------- Embeddings ----------------
+@lru_cache(maxsize=65536)
+def word_vector(word: str) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(word.encode("utf-8")).digest()[:8], "little") ^ FAKE_SEED
+    return np.random.default_rng(seed).standard_normal(FAKE_EMBED_DIM).astype(np.float32)
+
+def fake_embedding(text: str) -> List[float]:
+    words = WORD_RE.findall(text.lower()) or [""]
+    v = np.sum([word_vector(w) for w in words], axis=0)
+    v /= np.linalg.norm(v) or 1.0
+    return v.tolist()
+
+def unit(values: List[float]) -> np.ndarray:
+    v = np.asarray(values, dtype=np.float32)
+    return v / (np.linalg.norm(v) or 1.0)
+
+# ---------------- Latency / errors ----------------
+async def upstream(name: str):
+    """Simulated network delay; returns an error response for an injected failure."""
+    counts[name] = counts.get(name, 0) + 1
+    delay = max(0.0, FAKE_LATENCY_MS + rng.uniform(-FAKE_JITTER_MS, FAKE_JITTER_MS)) / 1000
+    await asyncio.sleep(delay)
+    if FAKE_ERROR_RATE and rng.random() < FAKE_ERROR_RATE:
+        counts[name + ".errors"] = counts.get(name + ".errors", 0) + 1
+        status = rng.choice([429, 500])
+        return JSONResponse({"error": {"message": f"injected {status}", "type": "fake", "code": status}}, status_code=status)
+    return None
+
+# ---------------- OpenAI ----------------
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    if (err := await upstream("embeddings")) is not None:
+        return err
+    inputs = body.get("input")
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    data = [{"object": "embedding", "index": i, "embedding": fake_embedding(t)} for i, t in enumerate(inputs)]
+    tokens = sum(len(t) // 4 + 1 for t in inputs)
+    return {"object": "list", "data": data, "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if (err := await upstream("chat")) is not None:
+        return err
+    model = body.get("model", "fake")
+    created = int(time.time())
+    if not body.get("stream"):
+        return {"id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": FAKE_REPLY}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+
+    def chunk(delta: Dict[str, Any], finish=None) -> str:
+        return "data: " + json.dumps({"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                                      "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}) + "\n\n"
+
+    async def stream():
+        yield chunk({"role": "assistant", "content": ""})
+        for tok in re.findall(r"\S+\s*", FAKE_REPLY):
+            await asyncio.sleep(FAKE_TOKEN_MS / 1000)
+            yield chunk({"content": tok})
+        yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.get("/v1/models/{model}")
+async def retrieve_model(model: str):
+    return {"id": model, "object": "model", "created": 0, "owned_by": "fake"}
+
+# ---------------- Pinecone (data plane) ----------------
+@app.post("/vectors/upsert")
+async def upsert(request: Request):
+    body = await request.json()
+    if (err := await upstream("upsert")) is not None:
+        return err
+    ns = vectors.setdefault(body.get("namespace", ""), {})
+    for v in body.get("vectors", []):
+        ns[v["id"]] = (unit(v["values"]), v.get("metadata") or {})
+    return {"upsertedCount": len(body.get("vectors", []))}
+
+@app.post("/vectors/delete")
+async def delete(request: Request):
+    body = await request.json()
+    if (err := await upstream("delete")) is not None:
+        return err
+    ns = vectors.get(body.get("namespace", ""), {})
+    if body.get("deleteAll"):
+        ns.clear()
+    for pid in body.get("ids") or []:
+        ns.pop(pid, None)
+    return {}
+
+@app.post("/query")
+async def query(request: Request):
+    body = await request.json()
+    if (err := await upstream("query")) is not None:
+        return err
+    namespace = body.get("namespace", "")
+    ns = vectors.get(namespace, {})
+    top_k = int(body.get("topK", 10))
+    matches = []
+    if ns and body.get("vector"):
+        ids = list(ns)
+        scores = np.stack([ns[i][0] for i in ids]) @ unit(body["vector"])
+        for j in np.argsort(-scores)[:top_k]:
+            m = {"id": ids[j], "score": float(scores[j])}
+            if body.get("includeMetadata"):
+                m["metadata"] = ns[ids[j]][1]
+            matches.append(m)
+    return {"matches": matches, "namespace": namespace, "usage": {"readUnits": 1}}
+
+@app.post("/describe_index_stats")
+@app.get("/describe_index_stats")
+async def describe_index_stats():
+    if (err := await upstream("describe_index_stats")) is not None:
+        return err
+    total = sum(len(ns) for ns in vectors.values())
+    return {"namespaces": {name: {"vectorCount": len(ns)} for name, ns in vectors.items()},
+            "dimension": FAKE_EMBED_DIM, "indexFullness": 0.0, "totalVectorCount": total}
+
+@app.get("/fake/stats")
+async def fake_stats():
+    return {"requests": counts, "vectors": {name: len(ns) for name, ns in vectors.items()}}
+
+def main() -> None:
+    global FAKE_LATENCY_MS, FAKE_JITTER_MS, FAKE_ERROR_RATE, FAKE_TOKEN_MS
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8100)
+    ap.add_argument("--latency-ms", type=float, default=FAKE_LATENCY_MS)
+    ap.add_argument("--jitter-ms", type=float, default=FAKE_JITTER_MS)
+    ap.add_argument("--error-rate", type=float, default=FAKE_ERROR_RATE)
+    ap.add_argument("--token-ms", type=float, default=FAKE_TOKEN_MS, help="delay between streamed chat tokens")
+    args = ap.parse_args()
+    FAKE_LATENCY_MS, FAKE_JITTER_MS = args.latency_ms, args.jitter_ms
+    FAKE_ERROR_RATE, FAKE_TOKEN_MS = args.error_rate, args.token_ms
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Tiny in-memory Redis stand-in (RESP2/RESP3 over TCP) for trying SESSION_BACKEND=redis without a server.
+
+    python bench/fake_redis.py [--port 6390]
+    SESSION_BACKEND=redis SESSION_REDIS_URL=redis://127.0.0.1:6390/0 uvicorn server.app:app --workers 4
+
+    python bench/fake_redis.py --check    # round-trip sessions through RedisSessionStore and time it
+
+It speaks just enough of the protocol for server/sessions.py and redis-py's
+connection handshake: HELLO, PING, ECHO, CLIENT, SELECT, HSET, HGETALL, RPUSH, LRANGE,
+LTRIM, EXPIRE, TTL, DEL, DBSIZE and FLUSHDB, with pipelining and lazy key expiry.
+Everything lives in one process's memory and is gone when it exits.
+"""
+import os, sys, time, asyncio, argparse, threading
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+class RespError(Exception):
+    pass
+
+def encode(value: Any, proto: int = 2) -> bytes:
+    if isinstance(value, RespError):
+        return b"-" + str(value).encode() + b"\r\n"
+    if value is None:
+        return b"_\r\n" if proto == 3 else b"$-1\r\n"
+    if value is True:
+        return b"+OK\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode(v, proto) for v in value)
+    if isinstance(value, dict):
+        if proto == 3:
+            return b"%%%d\r\n" % len(value) + b"".join(encode(k, 3) + encode(v, 3) for k, v in value.items())
+        return encode([x for pair in value.items() for x in pair], proto)  # RESP2: flat field/value array
+    raise TypeError(f"cannot encode {type(value).__name__}")
+
+def span(n: int, start: int, stop: int) -> slice:
+    # Redis ranges are inclusive and accept negative offsets from the end
+    start = max(n + start, 0) if start < 0 else start
+    stop = n + stop if stop < 0 else stop
+    return slice(start, max(stop + 1, start))
+
+class FakeRedis:
+    def __init__(self):
+        self.data: Dict[bytes, Any] = {}
+        self.expires: Dict[bytes, float] = {}
+        self.commands = 0
+
+    def _get(self, key: bytes, kind: type) -> Any:
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        value = self.data.get(key)
+        if value is not None and not isinstance(value, kind):
+            raise RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def execute(self, args: List[bytes], conn: Dict[str, Any]) -> Any:
+        self.commands += 1
+        name = args[0].decode().upper()
+        if name == "HELLO":
+            return self.hello(conn, *args[1:2])
+        handler = getattr(self, "cmd_" + name.lower(), None)
+        if handler is None:
+            return RespError(f"ERR unknown command '{name}'")
+        try:
+            return handler(*args[1:])
+        except RespError as e:
+            return e
+        except (TypeError, ValueError):
+            return RespError(f"ERR wrong number or type of arguments for '{name}' command")
+
+    def hello(self, conn: Dict[str, Any], proto: bytes = b"2") -> Any:
+        # redis-py 5+ opens every connection with HELLO 3 (RESP3) by default
+        if proto not in (b"2", b"3"):
+            return RespError("NOPROTO unsupported protocol version")
+        conn["proto"] = int(proto)
+        return {"server": "fake-redis", "version": "7.0.0", "proto": conn["proto"], "id": conn["id"],
+                "mode": "standalone", "role": "master", "modules": []}
+
+    def cmd_ping(self, message: Optional[bytes] = None):
+        return message if message is not None else b"PONG"
+
+    def cmd_echo(self, message: bytes):
+        return message
+
+    def cmd_client(self, *args: bytes):
+        return True  # SETINFO / SETNAME from the client handshake
+
+    def cmd_select(self, db: bytes):
+        if int(db) != 0:
+            raise RespError("ERR only database 0 is supported")
+        return True
+
+    def cmd_hset(self, key: bytes, *pairs: bytes):
+        if not pairs or len(pairs) % 2:
+            raise ValueError
+        h = self._get(key, dict)
+        if h is None:
+            h = self.data[key] = {}
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in h
+            h[field] = value
+        return added
+
+    def cmd_hgetall(self, key: bytes):
+        return dict(self._get(key, dict) or {})
+
+    def cmd_rpush(self, key: bytes, *values: bytes):
+        if not values:
+            raise ValueError
+        lst = self._get(key, list)
+        if lst is None:
+            lst = self.data[key] = []
+        lst.extend(values)
+        return len(lst)
+
+    def cmd_lrange(self, key: bytes, start: bytes, stop: bytes):
+        lst = self._get(key, list) or []
+        return lst[span(len(lst), int(start), int(stop))]
+
+    def cmd_ltrim(self, key: bytes, start: bytes, stop: bytes):
+        lst = self._get(key, list)
+        if lst is not None:
+            lst[:] = lst[span(len(lst), int(start), int(stop))]
+            if not lst:
+                self.cmd_del(key)
+        return True
+
+    def cmd_expire(self, key: bytes, seconds: bytes):
+        if self._get(key, object) is None:
+            return 0
+        self.expires[key] = time.monotonic() + int(seconds)
+        return 1
+
+    def cmd_ttl(self, key: bytes):
+        if self._get(key, object) is None:
+            return -2
+        deadline = self.expires.get(key)
+        return -1 if deadline is None else max(0, round(deadline - time.monotonic()))
+
+    def cmd_del(self, *keys: bytes):
+        removed = 0
+        for key in keys:
+            removed += self._get(key, object) is not None
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return removed
+
+    def cmd_dbsize(self):
+        return sum(self._get(key, object) is not None for key in list(self.data))
+
+    def cmd_flushdb(self, *args: bytes):
+        self.data.clear()
+        self.expires.clear()
+        return True
+
+async def serve_client(db: FakeRedis, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    conn = {"id": id(writer), "proto": 2}
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.startswith(b"*"):
+                writer.write(encode(RespError("ERR only RESP arrays are supported")))
+                continue
+            args = []
+            for _ in range(int(line[1:])):
+                size = int((await reader.readline())[1:])  # $<len>
+                args.append((await reader.readexactly(size + 2))[:-2])
+            writer.write(encode(db.execute(args, conn), conn["proto"]))
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(db: FakeRedis, host: str, port: int, on_ready: Optional[Callable[[int], None]] = None) -> None:
+    server = await asyncio.start_server(lambda r, w: serve_client(db, r, w), host, port)
+    if on_ready is not None:
+        on_ready(server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+def start_in_thread(host: str = "127.0.0.1", port: int = 0) -> int:
+    """Serve a fresh FakeRedis from a daemon thread; returns the bound port."""
+    ready = threading.Event()
+    bound: List[int] = []
+
+    def on_ready(p: int) -> None:
+        bound.append(p)
+        ready.set()
+
+    threading.Thread(target=lambda: asyncio.run(serve(FakeRedis(), host, port, on_ready)), daemon=True).start()
+    if not ready.wait(5):
+        raise RuntimeError("fake redis did not start")
+    return bound[0]
+
+def check(rounds: int) -> None:
+    from server.sessions import RedisSessionStore
+
+    port = start_in_thread()
+    store = RedisSessionStore(url=f"redis://127.0.0.1:{port}/0", ttl=60, max_history=4)
+
+    s = store.load("check")
+    assert s.hair_type is None and not s.history, "fresh session should be empty"
+    s.hair_type, s.concern = "curly", "frizz"
+    for i in range(6):
+        s.add_message("user" if i % 2 == 0 else "assistant", f"message {i}")
+    store.save(s)
+    again = store.load("check")
+    assert (again.hair_type, again.concern) == ("curly", "frizz"), again.state()
+    assert list(again.history) == list(s.history), list(again.history)  # trimmed to the last 4
+    print(f"round trip ok: {again.state()['hair_type']}/{again.state()['concern']}, {len(again.history)} messages kept")
+
+    t0 = time.perf_counter()
+    for i in range(rounds):
+        sess = store.load(f"bench-{i % 100}")
+        sess.add_message("user", "I have wavy hair")
+        store.save(sess)
+    per = (time.perf_counter() - t0) / rounds * 1e6
+    print(f"load + save: {per:.0f} us per turn over {rounds} turns (two pipelined round trips)")
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=6390)
+    ap.add_argument("--check", action="store_true", help="exercise RedisSessionStore against an in-process stand-in and exit")
+    ap.add_argument("-n", "--rounds", type=int, default=2000)
+    args = ap.parse_args()
+    if args.check:
+        check(args.rounds)
+        return
+    print(f"fake redis on {args.host}:{args.port}")
+    asyncio.run(serve(FakeRedis(), args.host, args.port))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Load test for POST /chat with multi-turn conversations.
+
+Each conversation is three turns on its own session: hair type, then concern
+(the first recommendation), then a refinement that switches the concern (a
+second recommendation). Start the app first, ideally against
+bench/fake_backends.py so no API quota is spent:
+
+    python bench/fake_backends.py &
+    OPENAI_BASE_URL=http://127.0.0.1:8100/v1 PINECONE_HOST=http://127.0.0.1:8100 \\
+    OPENAI_API_KEY=fake PINECONE_API_KEY=fake uvicorn server.app:app --port 8000 &
+    python bench/load_chat.py -n 500 -c 50 --rate 20 --out load.json
+
+Without --rate conversations run closed-loop (`-c` at a time, back to back);
+with it they arrive as a Poisson process at that many per second, and `-c`
+caps how many can be open at once. In that mode the first turn is timed from
+the conversation's arrival, so time spent waiting for a free slot counts (it
+is also reported on its own as queue_wait). The report is JSON: per-stage and overall
+latency percentiles, throughput and errors. --max-p95-ms / --max-error-rate
+make the exit status non-zero when exceeded, for use as a pre-deploy gate.
+"""
+import os, sys, json, math, time, random, asyncio, argparse
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from shared.recs import CONCERNS, combos
+
+STAGES = ["hair_type", "concern", "refine"]
+HAIR_TEMPLATES = ["I have {h} hair", "my hair is pretty {h}", "{h}", "hi! {h} hair here"]
+CONCERN_TEMPLATES = ["{c} is my main issue", "I want more {c}", "something for {c} please", "{c}"]
+REFINE_TEMPLATES = ["actually I care more about {c}", "what about {c} instead?", "anything better for {c}?"]
+
+def percentile(sorted_ms: List[float], p: float) -> Optional[float]:
+    if not sorted_ms:
+        return None
+    k = max(0, math.ceil(p / 100 * len(sorted_ms)) - 1)  # nearest rank
+    return round(sorted_ms[k], 2)
+
+def summarize(ms: List[float], errors: int) -> Dict[str, Any]:
+    ms = sorted(ms)
+    total = len(ms) + errors
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "mean_ms": round(sum(ms) / len(ms), 2) if ms else None,
+        "p50_ms": percentile(ms, 50),
+        "p95_ms": percentile(ms, 95),
+        "p99_ms": percentile(ms, 99),
+        "max_ms": round(ms[-1], 2) if ms else None,
+    }
+
+# turns after the first must come back with a recommendation, not a question
+RECOMMEND_STAGES = {"concern", "refine"}
+
+def concern_phrase(rng: random.Random, concern: str) -> str:
+    # what users type ("oily", "greasy"), not the canonical name ("oil control")
+    return rng.choice([word for word, c in CONCERNS.items() if c == concern])
+
+def conversation(rng: random.Random) -> List[str]:
+    pairs = combos()
+    htype, concern = rng.choice(pairs)
+    other = rng.choice([c for _, c in pairs if c != concern])
+    return [
+        rng.choice(HAIR_TEMPLATES).format(h=htype),
+        rng.choice(CONCERN_TEMPLATES).format(c=concern_phrase(rng, concern)),
+        rng.choice(REFINE_TEMPLATES).format(c=concern_phrase(rng, other)),
+    ]
+
+class Recorder:
+    def __init__(self):
+        self.ms: Dict[str, List[float]] = {s: [] for s in STAGES}
+        self.errors: Dict[str, int] = {s: 0 for s in STAGES}
+        self.error_kinds: Dict[str, int] = {}
+        self.queue_ms: List[float] = []  # --rate only: arrival until a slot was free
+        self.conversations = 0
+
+    def error(self, stage: str, kind: str) -> None:
+        self.errors[stage] += 1
+        self.error_kinds[kind] = self.error_kinds.get(kind, 0) + 1
+
+async def run_conversation(client: httpx.AsyncClient, url: str, sid: str, turns: List[str],
+                           think: float, rec: Recorder, arrived: Optional[float] = None) -> None:
+    for stage, message in zip(STAGES, turns):
+        # open loop: the first turn started when the user arrived, not when a slot freed up
+        t0 = arrived if arrived is not None and stage == STAGES[0] else time.perf_counter()
+        try:
+            r = await client.post(url, json={"session_id": sid, "message": message})
+            elapsed = (time.perf_counter() - t0) * 1000
+            if r.status_code != 200:
+                rec.error(stage, f"http_{r.status_code}")
+                return  # the rest of the conversation depends on this turn
+            reply = r.json().get("reply")
+            if not reply:
+                rec.error(stage, "empty_reply")
+                return
+            if stage in RECOMMEND_STAGES and "href=" not in reply:
+                rec.error(stage, "no_recommendation")  # e.g. the concern was not recognized
+                return
+            rec.ms[stage].append(elapsed)
+        except httpx.TimeoutException:
+            rec.error(stage, "timeout")
+            return
+        except (httpx.HTTPError, ValueError) as e:
+            rec.error(stage, type(e).__name__)
+            return
+        if think:
+            await asyncio.sleep(think)
+    rec.conversations += 1
+
+async def run(args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    scripts = [conversation(rng) for _ in range(args.conversations)]
+    url = args.url.rstrip("/") + "/chat"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    rec = Recorder()
+    gate = asyncio.Semaphore(args.concurrency)
+    run_id = f"{int(time.time())}-{args.seed}"
+
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        async def one(i: int, turns: List[str], arrived: Optional[float] = None) -> None:
+            async with gate:
+                if arrived is not None:
+                    rec.queue_ms.append((time.perf_counter() - arrived) * 1000)
+                await run_conversation(client, url, f"load-{run_id}-{i}", turns, args.think_ms / 1000, rec, arrived)
+
+        # warm-up conversations are not recorded
+        warm = Recorder()
+        await asyncio.gather(*(run_conversation(client, url, f"warm-{run_id}-{i}", conversation(rng), 0, warm)
+                               for i in range(args.warmup)))
+
+        t0 = time.perf_counter()
+        if args.rate:
+            tasks = []
+            for i, turns in enumerate(scripts):
+                tasks.append(asyncio.create_task(one(i, turns, time.perf_counter())))
+                await asyncio.sleep(rng.expovariate(args.rate))
+            await asyncio.gather(*tasks)
+        else:
+            await asyncio.gather(*(one(i, turns) for i, turns in enumerate(scripts)))
+        wall = time.perf_counter() - t0
+
+    all_ms = [m for s in STAGES for m in rec.ms[s]]
+    all_errors = sum(rec.errors.values())
+    return {
+        "config": {"url": url, "conversations": args.conversations, "concurrency": args.concurrency,
+                   "rate": args.rate, "think_ms": args.think_ms, "seed": args.seed},
+        "wall_s": round(wall, 3),
+        "throughput": {
+            "requests_per_s": round(len(all_ms) / wall, 2) if wall else None,
+            "conversations_per_s": round(rec.conversations / wall, 2) if wall else None,
+        },
+        "completed_conversations": rec.conversations,
+        "stages": {s: summarize(rec.ms[s], rec.errors[s]) for s in STAGES},
+        "queue_wait": summarize(rec.queue_ms, 0) if args.rate else None,
+        "overall": summarize(all_ms, all_errors),
+        "error_kinds": rec.error_kinds,
+    }
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default=os.getenv("LOAD_URL", "http://127.0.0.1:8000"))
+    ap.add_argument("-n", "--conversations", type=int, default=200)
+    ap.add_argument("-c", "--concurrency", type=int, default=20)
+    ap.add_argument("--rate", type=float, default=0.0, help="conversation arrivals per second (0 = closed loop)")
+    ap.add_argument("--think-ms", type=float, default=0.0, help="pause between turns of one conversation")
+    ap.add_argument("--warmup", type=int, default=5, help="unrecorded conversations run first")
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="also write the JSON report here")
+    ap.add_argument("--max-p95-ms", type=float, help="fail if overall p95 exceeds this")
+    ap.add_argument("--max-error-rate", type=float, help="fail if the overall error rate exceeds this")
+    args = ap.parse_args()
+
+    report = asyncio.run(run(args))
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+
+    overall = report["overall"]
+    failed = []
+    if args.max_p95_ms is not None and (overall["p95_ms"] is None or overall["p95_ms"] > args.max_p95_ms):
+        failed.append(f"p95 {overall['p95_ms']}ms > {args.max_p95_ms}ms")
+    if args.max_error_rate is not None and overall["error_rate"] > args.max_error_rate:
+        failed.append(f"error rate {overall['error_rate']} > {args.max_error_rate}")
+    if failed:
+        print("FAILED: " + "; ".join(failed), file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
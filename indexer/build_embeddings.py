@@ -1,25 +1,109 @@
-import os, json, math
-from typing import List, Dict, Any
+import os, sys, json, math, time, random, hashlib, threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Dict, Any, Optional, Iterable, Iterator
 
 from openai import OpenAI
-from pinecone import Pinecone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from shared import tracing
+from shared.embed_cache import EmbeddingCache
+from shared.http_pool import PINECONE_POOL_SIZE, PoolStats, http_client, pinecone_client
+from shared.recs import RECS_FILE, RECS_TOP_K, combos, build_query, rec_key, save_table
+from shared.vector_index import VECTOR_BACKEND, LOCAL_INDEX_PREFIX, LocalIndex, PineconeIndex, save_local_index
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+# point at a proxy or bench/fake_backends.py; empty uses the public API
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "") or None
 OPENAI_MODEL_EMBED = os.getenv("OPENAI_MODEL_EMBED", "text-embedding-3-small")
 
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY", "")
 PINECONE_INDEX = os.getenv("PINECONE_INDEX", "ortahaus")
 PINECONE_NAMESPACE = os.getenv("PINECONE_NAMESPACE", "prod")
+# index data-plane URL; skips the host lookup by name (also how bench/fake_backends.py is wired in)
+PINECONE_HOST = os.getenv("PINECONE_HOST", "")
+
+# products.json from the scraper (parsed whole), or its products.jsonl (streamed line by line)
+DATA_FILE = os.getenv("PRODUCTS_FILE", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "products.json")))
+# content hashes of what is already in the index, so re-runs only touch changes
+MANIFEST_FILE = os.getenv("INDEX_MANIFEST_FILE", os.path.join(os.path.dirname(DATA_FILE), "index_manifest.json"))
+
+# embeddings requests are capped both by input count and by (approximate) token total
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "100000"))
+EMBED_RETRIES = int(os.getenv("EMBED_RETRIES", "4"))
+
+UPSERT_BATCH = int(os.getenv("UPSERT_BATCH", "50"))
+UPSERT_WORKERS = int(os.getenv("UPSERT_WORKERS", "4"))
+UPSERT_RETRIES = int(os.getenv("UPSERT_RETRIES", "4"))
+
+# pooled keep-alive clients: every batch reuses the same connections
+OPENAI_HTTP = PoolStats("openai")
+PINECONE_HTTP = PoolStats("pinecone", max_connections=max(PINECONE_POOL_SIZE, UPSERT_WORKERS))
+oai = OpenAI(api_key=OPENAI_API_KEY or None, base_url=OPENAI_BASE_URL, http_client=http_client(OPENAI_HTTP))
+if VECTOR_BACKEND == "local":
+    pc, index = None, None
+else:
+    pc = pinecone_client(PINECONE_API_KEY, pool_size=PINECONE_HTTP.max_connections)
+    index = pc.Index(host=PINECONE_HOST) if PINECONE_HOST else pc.Index(PINECONE_INDEX)
+cache = EmbeddingCache.from_env()
 
-DATA_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "products.json"))
+def approx_tokens(text: str) -> int:
+    return len(text) // 4 + 1  # ~4 chars per token for English text
 
-oai = OpenAI(api_key=OPENAI_API_KEY or None)
-pc = Pinecone(api_key=PINECONE_API_KEY or None)
-index = pc.Index(PINECONE_INDEX)
+def make_batches(texts: List[str], max_items: int = EMBED_BATCH_SIZE, max_tokens: int = EMBED_BATCH_TOKENS) -> List[List[int]]:
+    batches: List[List[int]] = []
+    cur: List[int] = []
+    cur_tokens = 0
+    for i, t in enumerate(texts):
+        n = approx_tokens(t)
+        if cur and (len(cur) >= max_items or cur_tokens + n > max_tokens):
+            batches.append(cur)
+            cur, cur_tokens = [], 0
+        cur.append(i)
+        cur_tokens += n
+    if cur:
+        batches.append(cur)
+    return batches
 
-def embed(text: str) -> List[float]:
-    resp = oai.embeddings.create(model=OPENAI_MODEL_EMBED, input=text)
-    return resp.data[0].embedding
+def embed_batch(texts: List[str]) -> List[List[float]]:
+    for attempt in range(EMBED_RETRIES + 1):
+        try:
+            with tracing.span("embed.batch", inputs=len(texts), attempt=attempt):
+                resp = oai.embeddings.create(model=OPENAI_MODEL_EMBED, input=texts)
+            # the API tags each result with its input position
+            return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+        except Exception as e:
+            if attempt == EMBED_RETRIES:
+                raise
+            delay = min(30.0, 2 ** attempt) + random.random()
+            print(f"Embedding batch of {len(texts)} failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+    return []
+
+def embed_many(texts: List[str]) -> List[Optional[List[float]]]:
+    # Cached texts cost nothing; each distinct remaining text is sent once, in
+    # batches. A batch that still fails after retries leaves None for its
+    # inputs instead of aborting the run.
+    vecs = cache.get_many(OPENAI_MODEL_EMBED, texts)
+    pending: Dict[str, List[int]] = {}
+    for i, v in enumerate(vecs):
+        if v is None:
+            pending.setdefault(texts[i], []).append(i)
+    uniq = list(pending)
+    tracing.current().set("cache_hits", len(texts) - sum(len(ix) for ix in pending.values()))
+    for batch in make_batches(uniq):
+        chunk = [uniq[j] for j in batch]
+        try:
+            fresh = embed_batch(chunk)
+        except Exception as e:
+            print(f"Giving up on embedding batch of {len(chunk)}: {e}")
+            continue
+        cache.put_many(OPENAI_MODEL_EMBED, chunk, fresh)
+        for t, v in zip(chunk, fresh):
+            for i in pending[t]:
+                vecs[i] = v
+    return vecs
 
 def normalize_metadata(md: Dict[str, Any]) -> Dict[str, Any]:
     safe: Dict[str, Any] = {}
@@ -34,41 +118,256 @@ def normalize_metadata(md: Dict[str, Any]) -> Dict[str, Any]:
             safe[k] = str(v)[:500]
     return safe
 
-def main():
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        items = json.load(f)
+def product_body(it: Dict[str, Any]) -> str:
+    return " ".join([
+        it.get("title",""),
+        it.get("description",""),
+        " ".join(it.get("bullets", [])[:12]),
+        f"How to use: {it.get('how_to_use','')}",
+        f"Ingredients: {it.get('ingredients','')}",
+    ])[:7000]
+
+def query_backend():
+    # The snapshot main() just wrote holds exactly what was upserted, and unlike
+    # Pinecone (eventually consistent) it already reflects this run's writes.
+    local = LocalIndex.load()
+    if len(local) or VECTOR_BACKEND == "local":
+        return local
+    return PineconeIndex(index, PINECONE_NAMESPACE, stats=PINECONE_HTTP)  # --recs-only with no snapshot yet
 
-    vectors = []
+def build_recommendations() -> None:
+    # A single batch covers every (hair type, concern) query the chat can ask.
+    pairs = combos()
+    with tracing.span("recommendations", pairs=len(pairs)) as sp:
+        with tracing.span("embed", texts=len(pairs)):
+            vecs = embed_many([build_query(h, c) for h, c in pairs])
+        backend = query_backend()
+        table: Dict[str, List[Dict[str, Any]]] = {}
+        with tracing.span("query", backend="local" if isinstance(backend, LocalIndex) else "pinecone"):
+            for (h, c), vec in zip(pairs, vecs):
+                if vec is not None:
+                    table[rec_key(h, c)] = backend.query(vec, RECS_TOP_K)
+        save_table(table)
+        sp.set("entries", len(table))
+    print(f"Wrote {len(table)} precomputed recommendations to {RECS_FILE}.")
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0  # summed over workers
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def add(self, items: int, seconds: float, failed: int = 0) -> None:
+        with self._lock:
+            self.items += items
+            self.busy += seconds
+            self.failed += failed
+
+    def report(self, wall: float) -> str:
+        rate = self.items / wall if wall else 0.0
+        return f"{self.name}: {self.items} items, {self.failed} failed, busy {self.busy:.2f}s, {rate:.1f} items/s over {wall:.2f}s wall"
+
+def upsert_chunk(chunk: List[Dict[str, Any]], stats: StageStats, done: set) -> None:
+    t0 = time.perf_counter()
+    for attempt in range(UPSERT_RETRIES + 1):
+        try:
+            with PINECONE_HTTP.track(), tracing.span("upsert", vectors=len(chunk), attempt=attempt):
+                index.upsert(vectors=chunk, namespace=PINECONE_NAMESPACE)
+            stats.add(len(chunk), time.perf_counter() - t0)
+            done.update(v["id"] for v in chunk)  # set.update is atomic under the GIL
+            return
+        except Exception as e:
+            if attempt == UPSERT_RETRIES:
+                stats.add(0, time.perf_counter() - t0, failed=len(chunk))
+                print(f"Giving up on upsert of {len(chunk)} vectors: {e}")
+                return
+            # full jitter keeps concurrent workers from retrying in lockstep
+            time.sleep(random.uniform(0, min(30.0, 2 ** attempt)))
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    buf: List[Any] = []
     for it in items:
-        body = " ".join([
-            it.get("title",""),
-            it.get("description",""),
-            " ".join(it.get("bullets", [])[:12]),
-            f"How to use: {it.get('how_to_use','')}",
-            f"Ingredients: {it.get('ingredients','')}",
-        ])[:7000]
-
-        vec = embed(body)
-        md = normalize_metadata({
-            "title": it.get("title",""),
-            "url": it.get("url",""),
-            "how_to_use": it.get("how_to_use",""),
-            "ingredients": it.get("ingredients",""),
-            "bullets": it.get("bullets", []),
-        })
-
-        vectors.append({
-            "id": it.get("id") or it.get("url"),
-            "values": vec,
-            "metadata": md,
-        })
-
-    # Upsert in chunks
-    BATCH = 50
-    for i in range(0, len(vectors), BATCH):
-        chunk = vectors[i:i+BATCH]
-        index.upsert(vectors=chunk, namespace=PINECONE_NAMESPACE)
-        print(f"Upserted {len(chunk)} vectors to index '{PINECONE_INDEX}' in namespace '{PINECONE_NAMESPACE}'.")
+        buf.append(it)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+def load_items() -> Iterator[Dict[str, Any]]:
+    with open(DATA_FILE, "r", encoding="utf-8") as f:
+        if DATA_FILE.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
+def product_metadata(it: Dict[str, Any]) -> Dict[str, Any]:
+    return normalize_metadata({
+        "title": it.get("title",""),
+        "url": it.get("url",""),
+        "how_to_use": it.get("how_to_use",""),
+        "ingredients": it.get("ingredients",""),
+        "bullets": it.get("bullets", []),
+    })
+
+def content_hash(body: str, md: Dict[str, Any]) -> str:
+    blob = json.dumps({"body": body, "metadata": md}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def manifest_scope() -> Dict[str, str]:
+    # a different model, backend or namespace invalidates every stored hash
+    return {"model": OPENAI_MODEL_EMBED, "backend": VECTOR_BACKEND, "index": PINECONE_INDEX, "namespace": PINECONE_NAMESPACE}
+
+def load_manifest() -> Dict[str, str]:
+    try:
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("scope") != manifest_scope():
+        return {}
+    return data.get("items") or {}
+
+def save_manifest(hashes: Dict[str, str]) -> None:
+    os.makedirs(os.path.dirname(MANIFEST_FILE), exist_ok=True)
+    tmp = MANIFEST_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"scope": manifest_scope(), "items": hashes}, f, indent=1, sort_keys=True)
+    os.replace(tmp, MANIFEST_FILE)
+
+def delete_ids(ids: List[str]) -> List[str]:
+    deleted: List[str] = []
+    for chunk in chunked(ids, 1000):
+        try:
+            with tracing.span("delete", ids=len(chunk)):
+                index.delete(ids=chunk, namespace=PINECONE_NAMESPACE)
+            deleted.extend(chunk)
+        except Exception as e:
+            print(f"Failed to delete {len(chunk)} stale vectors: {e}")
+    return deleted
+
+def main():
+    if "--recs-only" in sys.argv:
+        build_recommendations()
+        return
+
+    # Only new or changed products (by content hash) are embedded and
+    # upserted; vanished ones are deleted. --full re-embeds everything but
+    # still uses the manifest to find what has to be deleted.
+    full = "--full" in sys.argv
+    manifest = load_manifest()
+    prev = LocalIndex.load()
+    prev_rows = {pid: i for i, pid in enumerate(prev.ids)}
+
+    hashes: Dict[str, str] = {}
+    unchanged: set = set()
+    changed = 0
+    snap_ids: List[str] = []
+    snap_meta: List[Dict[str, Any]] = []
+    snap_vecs = array("f")
+
+    def changed_items() -> Iterator[Dict[str, Any]]:
+        # Yields new or changed products as the file is read, so only the
+        # batch being embedded holds product bodies; per product, just the id
+        # and hash are kept for the manifest (and the snapshot row itself).
+        nonlocal changed
+        for it in load_items():
+            pid = it.get("id") or it.get("url")
+            body = product_body(it)
+            md = product_metadata(it)
+            h = content_hash(body, md)
+            if pid in hashes:
+                continue  # duplicate record; first one wins
+            hashes[pid] = h
+            if not full and manifest.get(pid) == h and pid in prev_rows:
+                unchanged.add(pid)
+                row = prev_rows[pid]
+                snap_ids.append(pid)
+                snap_meta.append(prev.metadata[row])
+                snap_vecs.extend(prev.matrix[row].tolist())
+            else:
+                changed += 1
+                yield {"id": pid, "body": body, "metadata": md}
+
+    # Embedding batches feed a bounded pool of upsert workers directly; the
+    # semaphore caps queued + in-flight chunks so memory stays flat and the
+    # embedder blocks when Pinecone falls behind.
+    embed_stats = StageStats("embed")
+    upsert_stats = StageStats("upsert")
+    slots = threading.BoundedSemaphore(UPSERT_WORKERS * 2)
+    pool = ThreadPoolExecutor(max_workers=UPSERT_WORKERS, thread_name_prefix="upsert")
+    pending = set()
+    stored: set = set()
+    started = time.perf_counter()
+
+    for items in chunked(changed_items(), EMBED_BATCH_SIZE):
+        t0 = time.perf_counter()
+        with tracing.span("embed", texts=len(items)):
+            vecs = embed_many([it["body"] for it in items])
+        embed_stats.add(sum(v is not None for v in vecs), time.perf_counter() - t0, failed=sum(v is None for v in vecs))
+
+        vectors = []
+        for it, vec in zip(items, vecs):
+            if vec is None:
+                print(f"Skipping {it['metadata'].get('url','')}: no embedding")
+                continue
+            vectors.append({"id": it["id"], "values": vec, "metadata": it["metadata"]})
+            snap_ids.append(it["id"])
+            snap_meta.append(it["metadata"])
+            snap_vecs.extend(vec)
+
+        if index is None:
+            stored.update(v["id"] for v in vectors)
+            continue
+        for chunk in chunked(vectors, UPSERT_BATCH):
+            slots.acquire()
+            fut = pool.submit(tracing.bind(upsert_chunk), chunk, upsert_stats, stored)
+            fut.add_done_callback(lambda _f: slots.release())
+            pending.add(fut)
+            pending = {f for f in pending if not f.done()}
+
+    wait(pending)
+    pool.shutdown()
+
+    # removals are only known once the whole file has been read
+    removed = [pid for pid in manifest if pid not in hashes]
+    print(f"{len(hashes)} products: {changed} new or changed, {len(hashes) - changed} unchanged, {len(removed)} removed.")
+    run = tracing.current()
+    run.set("products", len(hashes))
+    run.set("changed", changed)
+    run.set("removed", len(removed))
+    deleted = delete_ids(removed) if index is not None else removed
+    wall = time.perf_counter() - started
+
+    # The local snapshot is always written so the server can run offline.
+    with tracing.span("snapshot.save", vectors=len(snap_ids)):
+        save_local_index(snap_ids, snap_meta, snap_vecs)
+    print(f"Wrote local index ({len(snap_ids)} vectors) to {LOCAL_INDEX_PREFIX}.npy")
+    if index is not None:
+        print(f"Upserted {upsert_stats.items} and deleted {len(deleted)} vectors in index '{PINECONE_INDEX}' namespace '{PINECONE_NAMESPACE}'.")
+
+    # Record unchanged + successfully stored items; anything that failed (or a
+    # stale id we could not delete) stays out of date and is retried next run.
+    kept = {pid: h for pid, h in hashes.items() if pid in unchanged or pid in stored}
+    kept.update({pid: manifest[pid] for pid in set(removed) - set(deleted)})
+    save_manifest(kept)
+
+    if changed or removed or not os.path.exists(RECS_FILE):
+        build_recommendations()
+    st = cache.stats()
+    print(embed_stats.report(wall))
+    if index is not None:
+        print(upsert_stats.report(wall))
+    print(f"Embedding cache: {st['hits']} hits, {st['misses']} misses.")
+    for pool in (OPENAI_HTTP, PINECONE_HTTP):
+        if pool.requests:
+            print(f"HTTP pool {pool.name}: {json.dumps(pool.stats())}")
 
 if __name__ == "__main__":
-    main()
+    tracing.init("ortahaus-indexer")
+    with tracing.trace("index", backend=VECTOR_BACKEND, full="--full" in sys.argv, recs_only="--recs-only" in sys.argv):
+        main()
@@ -1,116 +1,564 @@
-import os, re, json, time
+import os, re, sys, json, time, sqlite3, hashlib, threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from lxml import etree
+from urllib.parse import urljoin, urlsplit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from shared import tracing
 
 BASE_URL = os.getenv("BASE_URL", "https://ortahaus.com")
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "8"))
+SCRAPE_RATE = float(os.getenv("SCRAPE_RATE", "4"))  # max requests/second per host; 0 = unlimited
+SCRAPE_RETRIES = int(os.getenv("SCRAPE_RETRIES", "3"))
+# "html" crawls sitemap + product pages; "json" pulls Shopify's /products.json catalog
+SCRAPE_MODE = os.getenv("SCRAPE_MODE", "html").strip().lower()
+# in json mode, fetch the product page only when how-to-use/ingredients are missing from body_html
+SCRAPE_JSON_FALLBACK = os.getenv("SCRAPE_JSON_FALLBACK", "1") == "1"
+# only child sitemaps whose URL contains this are followed (Shopify: sitemap_products_N.xml); "" = all
+SITEMAP_CHILD_FILTER = os.getenv("SITEMAP_CHILD_FILTER", "product")
 
 OUT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
 os.makedirs(OUT_DIR, exist_ok=True)
 OUT_FILE = os.path.join(OUT_DIR, "products.json")
+# products are appended here as they are scraped; the checkpoint lists finished URLs
+JSONL_FILE = os.path.join(OUT_DIR, "products.jsonl")
+CHECKPOINT_FILE = os.path.join(OUT_DIR, "scrape_checkpoint.txt")
+# conditional-GET cache of page bodies + extracted fields; set HTTP_CACHE_FILE="" to disable
+HTTP_CACHE_FILE = os.getenv("HTTP_CACHE_FILE", os.path.join(OUT_DIR, "http_cache.sqlite"))
+HTTP_CACHE_DIR = HTTP_CACHE_FILE + ".d"  # streamed bodies (sitemaps) live here as files
+# bump when extract_product_fields changes output so cached fields are recomputed
+FIELDS_VERSION = 1
 
 session = requests.Session()
 session.headers.update({"User-Agent": "OrtahausBot/1.0 (+https://ortahaus.com)"})
+# one keep-alive pool sized for the worker count; transient failures and
+# 429s are retried with exponential backoff (honouring Retry-After)
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=SCRAPE_CONCURRENCY,
+    max_retries=Retry(
+        total=SCRAPE_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    ),
+)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
 
-def get_sitemap_urls():
-    # Try /sitemap.xml then fallback to shopify product sitemap
-    urls = set()
-    for path in ["/sitemap.xml", "/sitemap_products_1.xml"]:
+class HostRateLimiter:
+    """Spaces requests to the same host at least 1/rate seconds apart across all threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next.get(host, now))
+            self._next[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+limiter = HostRateLimiter(SCRAPE_RATE)
+
+def fetch(url: str, timeout: float = 30, headers=None) -> requests.Response:
+    limiter.wait(url)
+    return session.get(url, timeout=timeout, headers=headers)
+
+class HttpCache:
+    """Per-URL validators, body and extracted fields in sqlite, shared by the crawler threads."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body TEXT NOT NULL, "
+            "fields TEXT, fields_version INTEGER, fetched_at REAL NOT NULL)"
+        )
         try:
-            resp = session.get(urljoin(BASE_URL, path), timeout=20)
-            if resp.status_code == 200:
-                soup = BeautifulSoup(resp.text, "xml")
-                for loc in soup.find_all("loc"):
-                    u = loc.get_text(strip=True)
-                    if "/products/" in u:
-                        urls.add(u)
-        except Exception:
+            self._db.execute("ALTER TABLE pages ADD COLUMN lastmod TEXT")  # caches from before sitemap lastmod
+        except sqlite3.OperationalError:
             pass
-    return sorted(urls)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS streams ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, path TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
 
-def clean_text(text: str) -> str:
-    return re.sub(r"\s+", " ", (text or "").strip())
+    def get(self, url: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, body, fields, fields_version, lastmod FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        fields = json.loads(row[3]) if row[3] and row[4] == FIELDS_VERSION else None
+        return {"etag": row[0], "last_modified": row[1], "body": row[2], "fields": fields, "lastmod": row[5]}
 
-def extract_product_fields(html: str, url: str):
-    soup = BeautifulSoup(html, "lxml")
+    def put(self, url: str, etag, last_modified, body: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, body, fields, fields_version, fetched_at) "
+                "VALUES (?, ?, ?, ?, NULL, NULL, ?)",
+                (url, etag, last_modified, body, time.time()),
+            )
+            self._db.commit()
 
-    title = soup.find("title").get_text(strip=True) if soup.find("title") else url
-    # meta description
-    desc = ""
-    md = soup.find("meta", attrs={"name": "description"})
-    if md and md.get("content"):
-        desc = md["content"]
+    def set_fields(self, url: str, fields, lastmod=None) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE pages SET fields = ?, fields_version = ?, lastmod = ? WHERE url = ?",
+                (json.dumps(fields, ensure_ascii=False), FIELDS_VERSION, lastmod, url),
+            )
+            self._db.commit()
 
-    # Try LD+JSON Product
-    how_to_use, ingredients = "", ""
-    bullets = []
+    def get_stream(self, url: str):
+        with self._lock:
+            row = self._db.execute("SELECT etag, last_modified, path FROM streams WHERE url = ?", (url,)).fetchone()
+        if row is None or not os.path.exists(row[2]):
+            return None
+        return {"etag": row[0], "last_modified": row[1], "path": row[2]}
 
-    for script in soup.find_all("script", attrs={"type":"application/ld+json"}):
-        try:
-            data = json.loads(script.string or "{}")
-            if isinstance(data, dict) and data.get("@type") == "Product":
-                ddesc = data.get("description") or ""
-                if ddesc and not desc:
-                    desc = ddesc
-                # nothing else standardized here
-        except Exception:
-            continue
+    def stream_path(self, url: str) -> str:
+        return os.path.join(HTTP_CACHE_DIR, hashlib.sha1(url.encode("utf-8")).hexdigest())
 
-    # Try to find sections by headings
-    def section_text(label: str) -> str:
-        # look for heading containing label
-        for hx in soup.find_all(re.compile("^h[1-6]$")):
-            if label.lower() in hx.get_text(" ", strip=True).lower():
-                frag = []
-                for sib in hx.find_all_next(["p","li"], limit=8):
-                    t = clean_text(sib.get_text(" ", strip=True))
-                    if t: frag.append(t)
-                return " ".join(frag)[:500]
-        return ""
+    def put_stream(self, url: str, etag, last_modified, path: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO streams (url, etag, last_modified, path, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, path, time.time()),
+            )
+            self._db.commit()
+
+http_cache = HttpCache(HTTP_CACHE_FILE) if HTTP_CACHE_FILE else None
+transfer = {"requests": 0, "not_modified": 0, "bytes": 0}
+_transfer_lock = threading.Lock()
 
-    how_to_use = section_text("How to use") or section_text("How To Use")
-    ingredients = section_text("Ingredients")
+def conditional_headers(entry):
+    headers = {}
+    if entry and entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry["last_modified"]:
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers or None
+
+def fetch_cached(url: str, timeout: float = 30):
+    """Returns (status, text, cached_fields); cached_fields is only set when the page was unchanged."""
+    entry = http_cache.get(url) if http_cache else None
+    r = fetch(url, timeout=timeout, headers=conditional_headers(entry))
+    with _transfer_lock:
+        transfer["requests"] += 1
+        transfer["bytes"] += len(r.content)
+        if r.status_code == 304:
+            transfer["not_modified"] += 1
+    if r.status_code == 304 and entry:
+        return 200, entry["body"], entry["fields"]
+    if r.status_code == 200 and http_cache:
+        http_cache.put(url, r.headers.get("ETag"), r.headers.get("Last-Modified"), r.text)
+    return r.status_code, r.text, None
+
+def _read_file(path: str, size: int = 65536):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+def _tee_to_cache(url: str, r: requests.Response, size: int = 65536):
+    # hand chunks to the parser while spooling them to disk; the cache entry
+    # is only recorded once the whole body arrived
+    path = http_cache.stream_path(url)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        for chunk in r.iter_content(size):
+            f.write(chunk)
+            with _transfer_lock:
+                transfer["bytes"] += len(chunk)
+            yield chunk
+    os.replace(tmp, path)
+    http_cache.put_stream(url, r.headers.get("ETag"), r.headers.get("Last-Modified"), path)
+
+def _count_bytes(r: requests.Response, size: int = 65536):
+    for chunk in r.iter_content(size):
+        with _transfer_lock:
+            transfer["bytes"] += len(chunk)
+        yield chunk
+
+def fetch_stream(url: str, timeout: float = 20):
+    """Returns (status, iterator of body chunks) without holding the body in memory."""
+    entry = http_cache.get_stream(url) if http_cache else None
+    limiter.wait(url)
+    r = session.get(url, timeout=timeout, headers=conditional_headers(entry), stream=True)
+    with _transfer_lock:
+        transfer["requests"] += 1
+        if r.status_code == 304:
+            transfer["not_modified"] += 1
+    if r.status_code == 304 and entry:
+        r.close()
+        return 200, _read_file(entry["path"])
+    if r.status_code != 200:
+        r.close()
+        return r.status_code, iter(())
+    return 200, (_tee_to_cache(url, r) if http_cache else _count_bytes(r))
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+def iter_sitemap(chunks):
+    """Yields ("url" | "sitemap", loc, lastmod) from a sitemap or sitemap index, one entry at a time."""
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, el in parser.read_events():
+            if event == "start":
+                if root is None:
+                    root = el
+                continue
+            kind = _local(el.tag)
+            if kind not in ("url", "sitemap"):
+                continue
+            loc, lastmod = "", None
+            for child in el:
+                name = _local(child.tag)
+                if name == "loc":
+                    loc = (child.text or "").strip()
+                elif name == "lastmod":
+                    lastmod = (child.text or "").strip() or None
+            if loc:
+                yield kind, loc, lastmod
+            root.clear()  # drop finished entries so memory stays flat
+    parser.close()
+
+def read_sitemap(url: str):
+    try:
+        with tracing.span("sitemap.read", url=url) as sp:
+            status, chunks = fetch_stream(url, timeout=20)
+            sp.set("status", status)
+            if status != 200:
+                return [], {}
+            children, products = [], {}
+            for kind, loc, lastmod in iter_sitemap(chunks):
+                if kind == "sitemap":
+                    children.append(loc)
+                elif "/products/" in loc:
+                    products[loc] = lastmod
+            sp.set("children", len(children))
+            sp.set("products", len(products))
+            return children, products
+    except Exception as e:
+        print(f"sitemap error {url} -> {e}")
+        return [], {}
+
+def get_sitemap_entries():
+    """Walks /sitemap.xml (and Shopify's product sitemap) breadth-first, fetching each level's children concurrently."""
+    seen = set()
+    entries = {}
+    level = [urljoin(BASE_URL, "/sitemap.xml"), urljoin(BASE_URL, "/sitemap_products_1.xml")]
+    with ThreadPoolExecutor(max_workers=SCRAPE_CONCURRENCY) as pool, tracing.span("sitemap") as sp:
+        while level:
+            level = [u for u in dict.fromkeys(level) if u not in seen]
+            seen.update(level)
+            children = []
+            for kids, products in pool.map(tracing.bind(read_sitemap), level):
+                children.extend(k for k in kids if SITEMAP_CHILD_FILTER in k)
+                for u, lastmod in products.items():
+                    entries[u] = lastmod or entries.get(u)
+            level = children
+        sp.set("sitemaps", len(seen))
+        sp.set("entries", len(entries))
+    return entries
+
+def get_sitemap_urls():
+    return sorted(get_sitemap_entries())
+
+def clean_text(text: str) -> str:
+    return re.sub(r"\s+", " ", (text or "").strip())
 
-    # Collect a few bullets if present (li items near details)
-    for li in soup.find_all("li"):
-        txt = clean_text(li.get_text(" ", strip=True))
-        if txt and len(bullets) < 8 and 8 <= len(txt) <= 180:
-            bullets.append(txt)
+_HEADING = re.compile("^h[1-6]$")
+# BeautifulSoup's get_text() leaves out strings anywhere inside these
+_SKIP_TEXT = {"script", "style", "template", "rt", "rp"}
+_SECTIONS = (("how_to_use", "how to use"), ("ingredients", "ingredients"))
 
-    return {
+def _strings(el):
+    if el.tag in _SKIP_TEXT:
+        return
+    if el.text:
+        yield el.text
+    for child in el:
+        if isinstance(child.tag, str):
+            yield from _strings(child)
+        if child.tail:
+            yield child.tail
+
+def _node_text(el, sep: str = " ") -> str:
+    for _ in el.iterancestors(*_SKIP_TEXT):
+        return ""
+    return sep.join(s for s in (t.strip() for t in _strings(el)) if s)
+
+def extract_product_fields(html: str, url: str):
+    # One document-order walk over a raw lxml tree; produces exactly what the
+    # original BeautifulSoup extractor (now in bench/bench_extract.py) did,
+    # without repeated tree scans.
+    fields = {
         "id": url,
         "url": url,
-        "title": title,
-        "description": desc,
-        "how_to_use": how_to_use,
-        "ingredients": ingredients,
-        "bullets": bullets,
+        "title": url,
+        "description": "",
+        "how_to_use": "",
+        "ingredients": "",
+        "bullets": [],
         "tags": [],
     }
+    root = None
+    if html and html.strip():
+        try:
+            root = etree.fromstring(html, etree.HTMLParser())
+        except ValueError:  # str with an XML encoding declaration
+            root = etree.fromstring(html.encode("utf-8"), etree.HTMLParser(encoding="utf-8"))
+    if root is None:
+        return fields
 
-def main():
-    product_urls = get_sitemap_urls()
-    if not product_urls:
-        print("No product URLs found via sitemap.")
-        return
+    title = None
+    meta_desc = None  # only the first <meta name="description"> counts
+    ld_desc = ""
+    # section name -> [remaining <p>/<li> to take, collected texts]
+    open_sections = {}
+    found = set()
+    bullets = fields["bullets"]
+
+    for el in root.iter():
+        tag = el.tag
+        if not isinstance(tag, str):
+            continue  # comments / processing instructions
+        if tag == "title":
+            if title is None:
+                title = _node_text(el, "")
+        elif tag == "meta":
+            if meta_desc is None and el.get("name") == "description":
+                meta_desc = el.get("content") or ""
+        elif tag == "script":
+            if not ld_desc and el.get("type") == "application/ld+json":
+                try:
+                    data = json.loads(el.text or "{}")
+                    if isinstance(data, dict) and data.get("@type") == "Product":
+                        ld_desc = data.get("description") or ""
+                except Exception:
+                    pass
+        elif tag == "p" or tag == "li":
+            if open_sections or tag == "li":
+                txt = clean_text(_node_text(el))
+                for sec in list(open_sections):
+                    frag = open_sections[sec]
+                    if txt:
+                        frag[1].append(txt)
+                    frag[0] -= 1
+                    if frag[0] == 0:
+                        fields[sec] = " ".join(open_sections.pop(sec)[1])[:500]
+                if tag == "li" and txt and len(bullets) < 8 and 8 <= len(txt) <= 180:
+                    bullets.append(txt)
+        elif len(found) < len(_SECTIONS) and _HEADING.search(tag):
+            heading = _node_text(el).lower()
+            for sec, label in _SECTIONS:
+                if sec not in found and label in heading:
+                    found.add(sec)
+                    open_sections[sec] = [8, []]
+
+    for sec, (_, frag) in open_sections.items():  # sections that ran out of document
+        fields[sec] = " ".join(frag)[:500]
+    if title is not None:
+        fields["title"] = title
+    fields["description"] = meta_desc or ld_desc
+    return fields
 
-    out = []
-    print(f"Found {len(product_urls)} product URLs")
-    for i,u in enumerate(product_urls, start=1):
+def scrape_one(u: str, lastmod=None):
+    with tracing.span("scrape.page", url=u) as sp:
         try:
-            r = session.get(u, timeout=30)
-            if r.status_code == 200:
-                data = extract_product_fields(r.text, u)
-                out.append(data)
+            if lastmod and http_cache:
+                # the sitemap says the page has not changed since we extracted it
+                entry = http_cache.get(u)
+                if entry and entry["fields"] and entry["lastmod"] == lastmod:
+                    sp.set("outcome", "lastmod_unchanged")
+                    return entry["fields"], None
+            status, text, fields = fetch_cached(u, timeout=30)
+            sp.set("status", status)
+            if status != 200:
+                sp.set("outcome", "skipped")
+                return None, f"skip {u} status={status}"
+            sp.set("outcome", "extracted" if fields is None else "not_modified")
+            if fields is None:  # new or changed page
+                with tracing.span("extract"):
+                    fields = extract_product_fields(text, u)
+            if http_cache:
+                http_cache.set_fields(u, fields, lastmod)
+            return fields, None
+        except Exception as e:
+            sp.error(e)
+            return None, f"error {u} -> {e}"
+
+class ScrapeLog:
+    """Append-only JSONL of scraped products plus a checkpoint of finished URLs.
+
+    A run that dies part-way leaves both files behind; the next run picks up
+    the checkpoint and only scrapes what is missing. compact() turns the JSONL
+    into the products.json the indexer reads and clears the checkpoint.
+    """
+
+    def __init__(self, jsonl_path: str, checkpoint_path: str, fresh: bool = False):
+        self.jsonl_path = jsonl_path
+        self.checkpoint_path = checkpoint_path
+        self.done = set()
+        resume = not fresh and os.path.exists(checkpoint_path)
+        if resume:
+            with open(checkpoint_path, "r", encoding="utf-8") as f:
+                self.done = {line.strip() for line in f if line.strip()}
+        mode = "a" if resume else "w"
+        self._records = open(jsonl_path, mode, encoding="utf-8")
+        self._checkpoint = open(checkpoint_path, mode, encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def add(self, fields) -> None:
+        with self._lock:
+            # record first: a crash in between re-scrapes the URL, and
+            # compact() keeps the last record per URL
+            self._records.write(json.dumps(fields, ensure_ascii=False) + "\n")
+            self._records.flush()
+            self._checkpoint.write(fields["url"] + "\n")
+            self._checkpoint.flush()
+            self.done.add(fields["url"])
+
+    def compact(self, out_file: str) -> int:
+        self._records.close()
+        self._checkpoint.close()
+        latest = {}
+        with open(self.jsonl_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    latest[rec["url"]] = rec
+        if latest:
+            tmp = out_file + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump([latest[u] for u in sorted(latest)], f, ensure_ascii=False, indent=2)
+            os.replace(tmp, out_file)
+        os.remove(self.checkpoint_path)  # run complete; next run starts fresh
+        return len(latest)
+
+def scrape_html(log: ScrapeLog):
+    entries = get_sitemap_entries()
+    product_urls = [u for u in sorted(entries) if u not in log.done]
+    if not entries:
+        print("No product URLs found via sitemap.")
+        return False
+
+    print(f"Found {len(entries)} product URLs, {len(product_urls)} left to scrape")
+    with ThreadPoolExecutor(max_workers=SCRAPE_CONCURRENCY) as pool:
+        futures = {pool.submit(tracing.bind(scrape_one), u, entries[u]): u for u in product_urls}
+        for i, fut in enumerate(as_completed(futures), start=1):
+            data, problem = fut.result()
+            if data is not None:
+                log.add(data)
                 print(f"[{i}/{len(product_urls)}] scraped:", data["title"][:80])
             else:
-                print(f"[{i}/{len(product_urls)}] skip {u} status={r.status_code}")
-        except Exception as e:
-            print(f"[{i}/{len(product_urls)}] error {u} -> {e}")
+                print(f"[{i}/{len(product_urls)}] {problem}")
+    return True
+
+def iter_catalog_json(limit: int = 250):
+    """Yields raw product dicts from Shopify's paginated /products.json."""
+    page = 1
+    while True:
+        status, text, _ = fetch_cached(urljoin(BASE_URL, f"/products.json?limit={limit}&page={page}"), timeout=30)
+        if status != 200:
+            print(f"products.json page {page} status={status}")
+            return
+        products = json.loads(text).get("products") or []
+        yield from products
+        if len(products) < limit:  # a short page is the last one
+            return
+        page += 1
+
+def fields_from_json(p):
+    url = urljoin(BASE_URL, f"/products/{p['handle']}")
+    # body_html is the product description block, so the page extractor
+    # finds its How to use / Ingredients sections and bullets directly
+    body = p.get("body_html") or ""
+    fields = extract_product_fields(f"<html><body>{body}</body></html>", url)
+    root = etree.fromstring(f"<div>{body}</div>", etree.HTMLParser()) if body.strip() else None
+    tags = p.get("tags") or []
+    if isinstance(tags, str):
+        tags = [t.strip() for t in tags.split(",") if t.strip()]
+    fields.update({
+        "title": p.get("title") or url,
+        "description": clean_text(_node_text(root)) if root is not None else "",
+        "tags": tags,
+    })
+    return fields
+
+def fill_from_html(fields):
+    # the page extract is one pass that already has sections and bullets, so
+    # take whichever of them body_html lacked
+    page, _ = scrape_one(fields["url"])
+    if page:
+        for k in ("how_to_use", "ingredients", "bullets"):
+            if not fields[k]:
+                fields[k] = page[k]
+    return fields
+
+def scrape_json(log: ScrapeLog):
+    with tracing.span("catalog.json") as sp:
+        out = [fields_from_json(p) for p in iter_catalog_json() if p.get("handle")]
+        sp.set("products", len(out))
+    if not out:
+        print("No products found via products.json.")
+        return False
+    missing = []
+    for f in out:
+        if f["url"] in log.done:
+            continue
+        if SCRAPE_JSON_FALLBACK and (not f["how_to_use"] or not f["ingredients"]):
+            missing.append(f)
+        else:
+            log.add(f)
+    print(f"Found {len(out)} products via products.json")
+    if missing:
+        print(f"Fetching {len(missing)} product pages for fields missing from JSON")
+        with ThreadPoolExecutor(max_workers=SCRAPE_CONCURRENCY) as pool:
+            for f in pool.map(tracing.bind(fill_from_html), missing):
+                log.add(f)
+    return True
+
+def main():
+    log = ScrapeLog(JSONL_FILE, CHECKPOINT_FILE, fresh="--fresh" in sys.argv)
+    if log.done:
+        print(f"Resuming: {len(log.done)} products already scraped")
+    ok = scrape_json(log) if SCRAPE_MODE == "json" else scrape_html(log)
+    if not ok:
+        return  # keep the checkpoint for the next attempt
 
-    with open(OUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(out, f, ensure_ascii=False, indent=2)
-    print("Wrote:", OUT_FILE)
+    with tracing.span("compact"):
+        n = log.compact(OUT_FILE)
+    tracing.current().set("products", n)
+    if n:
+        print(f"Wrote: {OUT_FILE} ({n} products)")
+    print(f"HTTP: {transfer['requests']} requests, {transfer['not_modified']} not modified, {transfer['bytes']} bytes downloaded")
 
 if __name__ == "__main__":
-    main()
+    tracing.init("ortahaus-scraper")
+    with tracing.trace("scrape", mode=SCRAPE_MODE, fresh="--fresh" in sys.argv):
+        main()
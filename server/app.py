@@ -1,39 +1,208 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
-import re
+import sys
+import html
 import json
-import time
-from typing import List, Optional, Dict, Any
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, AsyncIterator, Iterator
 
-from fastapi import FastAPI, Request, Body
+from fastapi import FastAPI, Request, Body, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
-import requests
-
 # OpenAI (python SDK v1.x)
-from openai import OpenAI
+from openai import AsyncOpenAI
 
-# Pinecone v3
-from pinecone import Pinecone
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from shared.embed_cache import EmbeddingCache
+from shared.lexical import LexicalIndex, rrf_fuse, tokenize
+from shared.http_pool import PoolStats, async_http_client, pinecone_client
+from shared.recs import RecTable, build_query
+from shared.reloadable import Reloadable
+from shared.signals import extract_signals, extra_terms
+from shared import tracing
+from shared.vector_index import VECTOR_BACKEND, LocalIndex, PineconeIndex
+from server.sessions import Session, make_session_store
+from server import metrics
+from server.metrics import Collected, CollectedGroup, Counter, Histogram
 
 # ---------------- Env ----------------
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+# point at a proxy or bench/fake_backends.py; empty uses the public API
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "") or None
 OPENAI_MODEL_CHAT = os.getenv("OPENAI_MODEL_CHAT", "gpt-4o-mini")
 OPENAI_MODEL_EMBED = os.getenv("OPENAI_MODEL_EMBED", "text-embedding-3-small")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY", "")
 PINECONE_INDEX = os.getenv("PINECONE_INDEX", "ortahaus")
 PINECONE_NAMESPACE = os.getenv("PINECONE_NAMESPACE", "prod")
+# index data-plane URL; skips the host lookup by name (also how bench/fake_backends.py is wired in)
+PINECONE_HOST = os.getenv("PINECONE_HOST", "")
 ALLOWED_ORIGINS = [o.strip() for o in os.getenv("ALLOWED_ORIGINS", "*").split(",")]
 BASE_URL = os.getenv("BASE_URL", "https://ortahaus.com")
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "8"))
+# threads for sqlite/Redis session loads and saves, kept apart from the search pool
+SESSION_WORKERS = int(os.getenv("SESSION_WORKERS", "4"))
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "10"))
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "10"))
+# let the chat model write the "why it fits" part of recommendations (streamed token by token)
+LLM_REPLIES = os.getenv("LLM_REPLIES", "0") == "1"
+# open connections and load caches before serving the first request
+WARMUP = os.getenv("WARMUP", "1") == "1"
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "15"))
+PORT = int(os.getenv("PORT", "8000"))
+# fuse BM25 hits over the catalog (reciprocal-rank fusion) with vector hits on live
+# searches, and with the precomputed list when the message says more than the pair
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+LEXICAL_TOP_K = int(os.getenv("LEXICAL_TOP_K", "10"))
 
 # ---------------- Clients ----------------
-oai = OpenAI(api_key=OPENAI_API_KEY or None)
-pc = Pinecone(api_key=PINECONE_API_KEY or None)
-index = pc.Index(PINECONE_INDEX)
+# Created on first use (or during warm-up) so importing the app never touches
+# the network and a missing key only fails the requests that need it.
+# Both share one keep-alive connection pool per upstream across all requests.
+_oai: Optional[AsyncOpenAI] = None
+_vector_index = None
+_vector_lock = asyncio.Lock()
+OPENAI_HTTP = PoolStats("openai")
+PINECONE_HTTP = PoolStats("pinecone", max_connections=SEARCH_WORKERS)
+
+def get_oai() -> AsyncOpenAI:
+    global _oai
+    if _oai is None:
+        _oai = AsyncOpenAI(
+            api_key=OPENAI_API_KEY or None,
+            base_url=OPENAI_BASE_URL,
+            timeout=EMBED_TIMEOUT,
+            http_client=async_http_client(OPENAI_HTTP, read_timeout=EMBED_TIMEOUT),
+        )
+    return _oai
+
+def open_vector_index():
+    if VECTOR_BACKEND == "local":
+        return LocalIndex.load()
+    # one pooled connection per search worker thread
+    pc = pinecone_client(PINECONE_API_KEY, pool_size=SEARCH_WORKERS, timeout=QUERY_TIMEOUT)
+    index = pc.Index(host=PINECONE_HOST) if PINECONE_HOST else pc.Index(PINECONE_INDEX)
+    return PineconeIndex(index, PINECONE_NAMESPACE, stats=PINECONE_HTTP)
+
+async def get_vector_index():
+    global _vector_index
+    if _vector_index is None:
+        async with _vector_lock:
+            if _vector_index is None:
+                # pc.Index() resolves the index host over the network, np.load reads disk
+                _vector_index = await run_blocking(open_vector_index)
+    return _vector_index
+
+# Pinecone's SDK is blocking; run its calls on a bounded pool so a slow
+# query never stalls the event loop (and never spawns unbounded threads).
+executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="pinecone")
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+# A query that times out keeps its search thread until Pinecone answers, so
+# session I/O gets its own pool: a stack of slow searches must never hold up
+# a session load, least of all for turns that only ask for the hair type.
+session_executor = ThreadPoolExecutor(max_workers=SESSION_WORKERS, thread_name_prefix="session")
+
+async def run_session_io(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(session_executor, fn, *args)
+
+# sqlite writes happen on the cache's own thread; lookups go through run_blocking
+EMBED_CACHE = EmbeddingCache.from_env(write_behind=True)
+
+# precomputed recommendations written by indexer/build_embeddings.py
+RECS = RecTable(load=False)
+
+# BM25 + product-name lookup over data/products.json, built during warm-up
+LEXICAL = LexicalIndex(load=False)
+
+# ---------------- Startup ----------------
+STARTUP: Dict[str, Any] = {}
+
+async def timed_step(name: str, coro) -> None:
+    t0 = time.perf_counter()
+    try:
+        await asyncio.wait_for(coro, timeout=WARMUP_TIMEOUT)
+        STARTUP["steps"][name] = round((time.perf_counter() - t0) * 1000, 1)
+    except Exception as e:
+        # a failed step is retried lazily by the first request that needs it
+        STARTUP["steps"][name] = f"failed after {(time.perf_counter() - t0) * 1000:.0f}ms: {type(e).__name__}: {e}"
+
+async def warm_vector_index() -> None:
+    index = await get_vector_index()
+    if index.blocking:
+        # first stats call opens the pooled HTTPS connection to the index host
+        await run_blocking(index.index.describe_index_stats)
+
+async def warm_openai() -> None:
+    # cheap authenticated GET: TLS handshake + key check before the first chat
+    await get_oai().models.retrieve(OPENAI_MODEL_EMBED)
+
+async def warm_up() -> None:
+    t0 = time.perf_counter()
+    STARTUP["steps"] = {}
+    steps = [
+        timed_step("recommendations", run_blocking(RECS.reload)),
+        timed_step("lexical_index", run_blocking(LEXICAL.reload)),
+        timed_step("vector_index", warm_vector_index()),
+    ]
+    if OPENAI_API_KEY:
+        steps.append(timed_step("openai", warm_openai()))
+    await asyncio.gather(*steps)
+    STARTUP["warmup_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+def reloadables() -> List[Reloadable]:
+    files = [RECS, LEXICAL]
+    if isinstance(_vector_index, LocalIndex):
+        files.append(_vector_index)
+    return files
+
+async def refresh_files() -> None:
+    # Requests only ever read the installed data; rereading and rebuilding a
+    # changed file happens here, on a worker thread, and is swapped in whole.
+    while True:
+        await asyncio.sleep(1.0)
+        for obj in reloadables():
+            if not obj.due():
+                continue
+            try:
+                if await run_blocking(obj.reload):
+                    print(f"reloaded {obj.path}", flush=True)
+            except Exception as e:
+                print(f"reload of {obj.path} failed: {type(e).__name__}: {e}", flush=True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP:
+        await warm_up()
+    else:
+        RECS.reload()
+        LEXICAL.reload()
+    print("startup:", json.dumps(STARTUP), flush=True)
+    refresher = asyncio.create_task(refresh_files())
+    yield
+    refresher.cancel()
+    tracing.flush()
+    await run_blocking(EMBED_CACHE.flush)
+    if _oai is not None:
+        await _oai.close()
+    executor.shutdown(wait=False, cancel_futures=True)
+    session_executor.shutdown(wait=False)  # queued session saves still run to completion
 
 # ---------------- App ----------------
-app = FastAPI(title="Ortahaus Product Guide")
+app = FastAPI(title="Ortahaus Product Guide", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -50,24 +219,80 @@ static_dir = os.path.abspath(static_dir)
 if os.path.isdir(static_dir):
     app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
-# simple in-memory session store
-SESSIONS: Dict[str, Dict[str, Any]] = {}
+# session store: bounded in-memory LRU by default, sqlite/redis to share across workers
+SESSIONS = make_session_store()
 
-def get_session(session_id: str) -> Dict[str, Any]:
-    if session_id not in SESSIONS:
-        SESSIONS[session_id] = {
-            "created_at": time.time(),
-            "hair_type": None,
-            "concern": None,
-            "finish_or_hold": None,
-            "history": [],
-        }
-    return SESSIONS[session_id]
+# ---------------- Metrics ----------------
+STAGE_SECONDS = Histogram("ortahaus_stage_seconds", "Time spent in each step of a chat turn.", ["stage"])
+T_SESSION_LOAD = STAGE_SECONDS.labels("session_load")
+T_SESSION_SAVE = STAGE_SECONDS.labels("session_save")
+T_SIGNALS = STAGE_SECONDS.labels("signals")
+T_RECS = STAGE_SECONDS.labels("precomputed_lookup")
+T_NAMED = STAGE_SECONDS.labels("named_lookup")
+T_LEXICAL = STAGE_SECONDS.labels("lexical")
+T_EMBED = STAGE_SECONDS.labels("embedding")
+T_QUERY = STAGE_SECONDS.labels("vector_query")
+T_CANDIDATE = STAGE_SECONDS.labels("candidate")
+T_REPLY = STAGE_SECONDS.labels("reply")
+T_LLM = STAGE_SECONDS.labels("llm_reply")
+TURN_SECONDS = Histogram("ortahaus_chat_turn_seconds", "End-to-end time of one chat turn.", ["transport"])
+TURNS = Counter("ortahaus_chat_turns_total", "Chat turns by how they were answered.", ["path"])
+BACKEND_ERRORS = Counter("ortahaus_backend_errors_total", "Failed or timed-out upstream calls.", ["backend", "kind"])
+
+def backend_error(backend: str, e: BaseException) -> None:
+    BACKEND_ERRORS.labels(backend, "timeout" if isinstance(e, asyncio.TimeoutError) else "error").inc()
+
+Collected("ortahaus_embedding_cache_hits_total", "Embedding cache hits.", lambda: EMBED_CACHE.hits, kind="counter")
+Collected("ortahaus_embedding_cache_misses_total", "Embedding cache misses.", lambda: EMBED_CACHE.misses, kind="counter")
+Collected("ortahaus_embedding_cache_entries", "Embeddings held in memory.", lambda: EMBED_CACHE.stats()["entries"])
+Collected("ortahaus_recommendations", "Precomputed (hair type, concern) entries loaded.", lambda: len(RECS))
+Collected("ortahaus_lexical_products", "Products in the BM25 index.", lambda: len(LEXICAL))
+CollectedGroup(SESSIONS.stats, {
+    "sessions": ("ortahaus_sessions", "Sessions held by the session store."),
+    "approx_bytes": ("ortahaus_session_bytes", "Approximate memory held by in-process sessions."),
+})
+Collected("ortahaus_upstream_requests_total", "Requests sent upstream.", kind="counter", labelnames=["upstream"],
+          fn=lambda: {(p.name,): p.requests for p in (OPENAI_HTTP, PINECONE_HTTP)})
+Collected("ortahaus_upstream_in_flight", "Upstream requests currently in flight.", labelnames=["upstream"],
+          fn=lambda: {(p.name,): p.in_flight for p in (OPENAI_HTTP, PINECONE_HTTP)})
+Collected("ortahaus_upstream_connects_total", "New TCP connections opened upstream.", kind="counter", labelnames=["upstream"],
+          fn=lambda: {(OPENAI_HTTP.name,): OPENAI_HTTP.connects})
+
+tracing.init("ortahaus-server")
+
+async def load_session(session_id: str) -> Session:
+    with T_SESSION_LOAD.time(), tracing.span("session.load", backend=type(SESSIONS).__name__):
+        if SESSIONS.blocking:
+            return await run_session_io(SESSIONS.load, session_id)
+        return SESSIONS.load(session_id)
+
+async def save_session(state: Session) -> None:
+    with T_SESSION_SAVE.time(), tracing.span("session.save"):
+        if SESSIONS.blocking:
+            await run_session_io(SESSIONS.save, state)
+        else:
+            SESSIONS.save(state)
 
 @app.get("/healthz")
 def healthz():
     return {"ok": True}
 
+@app.get("/stats")
+def stats():
+    return {
+        "embedding_cache": EMBED_CACHE.stats(),
+        "recommendations": len(RECS),
+        "lexical_products": len(LEXICAL),
+        "vector_backend": VECTOR_BACKEND,
+        "sessions": SESSIONS.stats(),
+        "startup": STARTUP,
+        "http": {"openai": OPENAI_HTTP.stats(), "pinecone": PINECONE_HTTP.stats()},
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/ui")
 def ui():
     # Lightweight guard to help devs if /static/index.html is missing
@@ -78,69 +303,59 @@ def ui():
 
 # ---------------- Helpers ----------------
 
-HAIR_TYPES = {"straight","wavy","curly","coily","fine","thick","thin","medium"}
-CONCERNS = {
-    "volume":"volume",
-    "volumize":"volume",
-    "hold":"hold",
-    "strong hold":"hold",
-    "matte":"matte",
-    "shine":"shine",
-    "gloss":"shine",
-    "frizz":"frizz",
-    "definition":"definition",
-    "hydrate":"hydration",
-    "hydration":"hydration",
-    "moisture":"hydration",
-    "oily":"oil control",
-    "greasy":"oil control",
-    "sweat":"sweat",
-    "texture":"texture",
-}
-
-def pick_hair_type(text: str) -> Optional[str]:
-    t = text.lower()
-    for h in sorted(HAIR_TYPES, key=len, reverse=True):
-        if re.search(rf"\\b{re.escape(h)}\\b", t):
-            return "thin" if h == "fine" else h
-    return None
-
-def pick_concern(text: str) -> Optional[str]:
-    t = text.lower()
-    for k,v in CONCERNS.items():
-        if re.search(rf"\\b{re.escape(k)}\\b", t):
-            return v
-    return None
-
-def embedding(text: str) -> List[float]:
-    resp = oai.embeddings.create(model=OPENAI_MODEL_EMBED, input=text)
-    return resp.data[0].embedding
-
-def search_products(query: str, top_k: int = 6) -> List[Dict[str, Any]]:
-    vec = embedding(query)
-    res = index.query(
-        namespace=PINECONE_NAMESPACE,
-        vector=vec,
-        top_k=top_k,
-        include_metadata=True,
-    )
-    hits = []
-    for m in res.matches or []:
-        md = m.get("metadata", {}) if isinstance(m, dict) else (m.metadata or {})
-        hits.append({
-            "id": getattr(m, "id", None) or md.get("url") or "",
-            "score": m.get("score") if isinstance(m, dict) else getattr(m, "score", None),
-            "title": md.get("title") or "",
-            "url": md.get("url") or "",
-            "how_to_use": md.get("how_to_use") or "",
-            "ingredients": md.get("ingredients") or "",
-            "bullets": md.get("bullets") or [],
-        })
+async def embedding(text: str) -> List[float]:
+    # the in-memory LRU is checked inline; sqlite (shared with the indexer,
+    # so it can wait on a write lock) only ever runs on a worker thread
+    vec = EMBED_CACHE.get_memory(OPENAI_MODEL_EMBED, text)
+    if vec is None and EMBED_CACHE.persistent:
+        vec = await run_blocking(EMBED_CACHE.get, OPENAI_MODEL_EMBED, text)
+    tracing.current().set("cache_hit", vec is not None)
+    if vec is not None:
+        return vec
+    try:
+        resp = await asyncio.wait_for(
+            get_oai().embeddings.create(model=OPENAI_MODEL_EMBED, input=text),
+            timeout=EMBED_TIMEOUT,
+        )
+    except Exception as e:
+        backend_error("openai_embeddings", e)
+        raise
+    vec = resp.data[0].embedding
+    EMBED_CACHE.put(OPENAI_MODEL_EMBED, text, vec)
+    return vec
+
+async def search_products(query: str, top_k: int = 6, lexical_query: str = "") -> List[Dict[str, Any]]:
+    lexical: List[Dict[str, Any]] = []
+    if HYBRID_SEARCH and lexical_query:
+        with T_LEXICAL.time(), tracing.span("lexical.search") as sp:
+            lexical = LEXICAL.search(lexical_query, LEXICAL_TOP_K)
+            sp.set("scores", [h["score"] for h in lexical])
+    with T_EMBED.time(), tracing.span("embedding", model=OPENAI_MODEL_EMBED):
+        vec = await embedding(query)
+    vector_index = await get_vector_index()
+    with T_QUERY.time(), tracing.span("vector.query", backend=VECTOR_BACKEND, top_k=top_k) as sp:
+        if not vector_index.blocking:
+            hits = vector_index.query(vec, top_k)
+        else:
+            try:
+                hits = await asyncio.wait_for(run_blocking(vector_index.query, vec, top_k), timeout=QUERY_TIMEOUT)
+            except Exception as e:
+                backend_error(VECTOR_BACKEND, e)
+                raise
+        sp.set("scores", [round(h["score"] or 0.0, 4) for h in hits])
+    if lexical:
+        hits = rrf_fuse([hits, lexical], top_k=top_k)
     return hits
 
-def craft_reply(name: str, url: str, how_to: str = "", ingredients: str = "") -> str:
-    link = f'<a href="{url}" target="_blank" rel="noopener" class="rec-link">{name}</a>'
-    parts = [f"I'd go with {link}."]
+def already_recommended(state: Session, hit: Dict[str, Any]) -> bool:
+    link = f'href="{hit["url"]}"'
+    return bool(hit["url"]) and any(role == "assistant" and link in content for role, content in state.history)
+
+def product_link(name: str, url: str) -> str:
+    return f'<a href="{url}" target="_blank" rel="noopener" class="rec-link">{name}</a>'
+
+def reply_details(how_to: str = "", ingredients: str = "") -> str:
+    parts = []
     if how_to:
         parts.append(f"How to use: {how_to.strip()}")
     if ingredients:
@@ -148,6 +363,9 @@ def craft_reply(name: str, url: str, how_to: str = "", ingredients: str = "") ->
     parts.append("Want a different finish or hold? I can tweak the rec.")
     return " ".join(parts)
 
+def craft_reply(name: str, url: str, how_to: str = "", ingredients: str = "") -> str:
+    return f"I'd go with {product_link(name, url)}. " + reply_details(how_to, ingredients)
+
 SYSTEM_PROMPT = (
     "You are the Ortahaus Product Guide. Be concise, friendly, and helpful. "
     "Only recommend a single product when ready. Ask follow-up questions when details are missing. "
@@ -155,43 +373,233 @@ SYSTEM_PROMPT = (
     "the server will format them."
 )
 
-# ---------------- Routes ----------------
-@app.post("/chat")
-async def chat(payload: Dict[str, Any] = Body(...)):
-    message = (payload.get("message") or "").strip()
-    session_id = payload.get("session_id") or "default"
-    state = get_session(session_id)
-    state["history"].append({"role": "user", "content": message})
+async def stream_llm_reply(state: Session, candidate: Dict[str, Any]) -> AsyncIterator[str]:
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    messages += [{"role": role, "content": content} for role, content in state.history]
+    messages.append({
+        "role": "system",
+        "content": (
+            f"The server has already told the user: \"I'd go with {candidate['title']}.\" "
+            f"Continue in under 60 words: why it fits {state.hair_type or 'their'} hair and {state.concern or 'their goals'}, "
+            f"plus a short how-to-use tip. How to use: {candidate.get('how_to_use','')} "
+            f"Ingredients: {candidate.get('ingredients','')}"
+        ),
+    })
+    stream = await get_oai().chat.completions.create(model=OPENAI_MODEL_CHAT, messages=messages, stream=True)
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+def say(payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield {"type": "delta", "text": payload["reply"]}
+    yield {"type": "done", **payload}
+
+async def respond_events(state: Session, message: str) -> AsyncIterator[Dict[str, Any]]:
+    # Yields {"type": "delta", "text": ...} chunks as the reply is produced and
+    # ends with {"type": "done", ...} carrying the same payload /chat returns.
+    session_id = state.session_id
+    state.add_message("user", message)
+    turn = tracing.current()
+    turn.set("session_id", session_id)
 
     # Extract signals
-    htype = pick_hair_type(message) or state.get("hair_type")
-    concern = pick_concern(message) or state.get("concern")
-    state["hair_type"] = htype
-    state["concern"] = concern
+    with T_SIGNALS.time(), tracing.span("signals.extract") as sp:
+        found_htype, found_concern = extract_signals(message)
+        sp.set("hair_type", found_htype)
+        sp.set("concern", found_concern)
+    htype = found_htype or state.hair_type
+    concern = found_concern or state.concern
+    state.hair_type = htype
+    state.concern = concern
+    turn.set("hair_type", htype)
+    turn.set("concern", concern)
+
+    # A product asked for by name needs neither more questions nor a search,
+    # unless we just recommended it ("tried the sea salt spray, what else?")
+    with T_NAMED.time(), tracing.span("lexical.named") as sp:
+        named = LEXICAL.named_product(message)
+        rejected = named if named and already_recommended(state, named) else None
+        if rejected:
+            named = None
+        sp.set("product_id", named["id"] if named else None)
+        sp.set("rejected_id", rejected["id"] if rejected else None)
 
     # Ask for missing info (one at a time)
-    if not htype:
-        return {"reply": "Got it! What’s your hair type (straight, wavy, curly, or coily)?", "session_id": session_id}
-    if not concern:
-        return {"reply": "What’s your main goal today—volume, hold, frizz control, hydration, or shine?", "session_id": session_id}
+    if not named and not htype:
+        TURNS.labels("ask_hair_type").inc()
+        turn.set("path", "ask_hair_type")
+        for ev in say({"reply": "Got it! What’s your hair type (straight, wavy, curly, or coily)?", "session_id": session_id}):
+            yield ev
+        return
+    if not named and not concern:
+        TURNS.labels("ask_concern").inc()
+        turn.set("path", "ask_concern")
+        for ev in say({"reply": "What’s your main goal today—volume, hold, frizz control, hydration, or shine?", "session_id": session_id}):
+            yield ev
+        return
 
-    # We have enough to search
-    query = f"Ortahaus product for {htype} hair; primary concern: {concern}. Return best match."
-    hits = search_products(query, top_k=5)
+    if named:
+        TURNS.labels("named_product").inc()
+        turn.set("path", "named_product")
+        hits = [named]
+    else:
+        # We have enough to search; the (hair type, concern) space is small
+        # enough that the indexer precomputes it, so live search is the fallback.
+        with T_RECS.time(), tracing.span("recs.lookup") as sp:
+            hits = RECS.get(htype, concern)
+            sp.set("hit", hits is not None)
+        if hits is not None:
+            TURNS.labels("precomputed").inc()
+            turn.set("path", "precomputed")
+            # the table only knows the pair; words beyond it ("argan oil", "sulfate
+            # free") pull matching products up, and win ties with the table's order
+            terms = extra_terms(tokenize(message)) if HYBRID_SEARCH else []
+            if terms:
+                with T_LEXICAL.time(), tracing.span("lexical.search", terms=terms) as sp:
+                    lexical = LEXICAL.search(" ".join(terms), LEXICAL_TOP_K)
+                    sp.set("scores", [h["score"] for h in lexical])
+                if lexical:
+                    hits = rrf_fuse([lexical, hits], top_k=max(len(hits), 5))
+        else:
+            TURNS.labels("search").inc()
+            turn.set("path", "search")
+            try:
+                # BM25 sees the user's own words, so product and ingredient names count
+                hits = await search_products(build_query(htype, concern), top_k=5, lexical_query=f"{message} {htype} {concern}")
+            except asyncio.TimeoutError:
+                for ev in say({
+                    "reply": "Sorry, the product catalog is taking too long to answer. Mind asking again in a moment?",
+                    "session_id": session_id,
+                }):
+                    yield ev
+                return
 
     # pick first strong match with a product URL
-    candidate = next((h for h in hits if h["url"].startswith("https://")), hits[0] if hits else None)
+    with T_CANDIDATE.time(), tracing.span("candidate.select", hits=len(hits)) as sp:
+        if rejected:
+            hits = [h for h in hits if h["id"] != rejected["id"]] or hits
+        candidate = next((h for h in hits if h["url"].startswith("https://")), hits[0] if hits else None)
+        if candidate:
+            sp.set("product_id", candidate["id"])
+            sp.set("score", candidate["score"])
 
     # Fallback text if no index yet
     if not candidate:
-        return {
+        for ev in say({
             "reply": (
                 "I don't see the product index yet. Try running the scraper and indexer, "
                 "then ask me again. In the meantime: tell me if you prefer matte or shine?"
             ),
             "session_id": session_id,
-        }
+        }):
+            yield ev
+        return
+
+    if LLM_REPLIES:
+        lead = f"I'd go with {product_link(candidate['title'], candidate['url'])}. "
+        parts = [lead]
+        yield {"type": "delta", "text": lead}
+        try:
+            # includes the time the client takes to accept each token
+            with T_LLM.time(), tracing.span("reply.llm", model=OPENAI_MODEL_CHAT):
+                async for token in stream_llm_reply(state, candidate):
+                    token = html.escape(token)  # model text is plain; only the server emits markup
+                    parts.append(token)
+                    yield {"type": "delta", "text": token}
+        except Exception as e:
+            backend_error("openai_chat", e)
+            if len(parts) == 1:  # nothing streamed yet: finish with the template
+                rest = reply_details(candidate.get("how_to_use",""), candidate.get("ingredients",""))
+                parts.append(rest)
+                yield {"type": "delta", "text": rest}
+        reply = "".join(parts)
+    else:
+        with T_REPLY.time(), tracing.span("reply.format"):
+            reply = craft_reply(candidate["title"], candidate["url"], candidate.get("how_to_use",""), candidate.get("ingredients",""))
+        yield {"type": "delta", "text": reply}
+    state.add_message("assistant", reply)
+    yield {"type": "done", "reply": reply, "session_id": session_id, "debug": {"htype": htype, "concern": concern}}
+
+async def respond(state: Session, message: str) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {}
+    async for ev in respond_events(state, message):
+        if ev["type"] == "done":
+            payload = {k: v for k, v in ev.items() if k != "type"}
+    return payload
+
+def sse(ev: Dict[str, Any]) -> str:
+    return f"event: {ev['type']}\ndata: {json.dumps(ev, ensure_ascii=False)}\n\n"
+
+# ---------------- Routes ----------------
+@app.post("/chat")
+async def chat(request: Request, payload: Dict[str, Any] = Body(...)):
+    message = (payload.get("message") or "").strip()
+    session_id = payload.get("session_id") or "default"
+    with TURN_SECONDS.labels("chat").time(), tracing.trace(
+        "chat", traceparent=request.headers.get("traceparent"), kind="SPAN_KIND_SERVER", transport="chat"
+    ):
+        state = await load_session(session_id)
+        try:
+            return await respond(state, message)
+        finally:
+            await save_session(state)
+
+@app.post("/chat/stream")
+async def chat_stream(request: Request, payload: Dict[str, Any] = Body(...)):
+    # Same conversation as /chat, sent as Server-Sent Events so the widget can
+    # render the reply while it is still being produced.
+    message = (payload.get("message") or "").strip()
+    session_id = payload.get("session_id") or "default"
+    state = await load_session(session_id)
+    traceparent = request.headers.get("traceparent")
+
+    async def events() -> AsyncIterator[str]:
+        with TURN_SECONDS.labels("stream").time(), tracing.trace(
+            "chat", traceparent=traceparent, kind="SPAN_KIND_SERVER", transport="stream"
+        ):
+            try:
+                async for ev in respond_events(state, message):
+                    yield sse(ev)
+            finally:
+                await save_session(state)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/ws")
+async def chat_ws(ws: WebSocket):
+    # One session per connection: it is loaded once, stays resident while the
+    # socket is open, and is saved after every turn. Client sends
+    # {"message": ...}; the server pushes {"type": "typing"}, then the same
+    # delta/done events as /chat/stream.
+    await ws.accept()
+    session_id = ws.query_params.get("session_id") or "default"
+    state = await load_session(session_id)
+    try:
+        while True:
+            try:
+                payload = await ws.receive_json()
+            except ValueError:
+                await ws.send_json({"type": "error", "error": "expected a JSON object"})
+                continue
+            message = (payload.get("message") or "").strip() if isinstance(payload, dict) else ""
+            # the session was loaded when the socket opened; keep it from aging out while in use
+            SESSIONS.touch(state)
+            with TURN_SECONDS.labels("ws").time(), tracing.trace("chat", kind="SPAN_KIND_SERVER", transport="ws"):
+                await ws.send_json({"type": "typing"})
+                async for ev in respond_events(state, message):
+                    await ws.send_json(ev)
+                await save_session(state)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await save_session(state)
+
+STARTUP["import_ms"] = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
 
-    reply = craft_reply(candidate["title"], candidate["url"], candidate.get("how_to_use",""), candidate.get("ingredients",""))
-    state["history"].append({"role": "assistant", "content": reply})
-    return {"reply": reply, "session_id": session_id, "debug": {"htype": htype, "concern": concern}}
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=PORT)
@@ -0,0 +1,176 @@
+import math
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+# Minimal Prometheus text-format metrics. Updates happen on the event loop, so the
+# hot path is a dict lookup done once at import plus a bisect and two additions.
+
+# seconds; spans cache hits (~µs) through slow OpenAI calls
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY: List[Any] = []
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    def esc(v: str) -> str:
+        return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{n}="{esc(v)}"' for n, v in zip(names, values)) + "}"
+
+def _num(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, n: float = 1.0) -> None:
+        self.value += n
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, n: float = 1.0) -> None:
+        self.labels().inc(n)
+
+    def render(self) -> List[str]:
+        out = super().render()
+        for values, child in list(self._children.items()):
+            out.append(f"{self.name}{_labels(self.labelnames, values)} {_num(child.value)}")
+        return out
+
+class _Timer:
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, hist: "_HistogramChild"):
+        self.hist = hist
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0)
+        return False
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # per bucket; made cumulative when rendered
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def render(self) -> List[str]:
+        out = super().render()
+        for values, child in list(self._children.items()):
+            acc = 0
+            for bound, n in zip(self.bounds + (math.inf,), child.counts):
+                acc += n
+                le = _labels(self.labelnames + ("le",), values + (_num(bound),))
+                out.append(f"{self.name}_bucket{le} {acc}")
+            lbl = _labels(self.labelnames, values)
+            out.append(f"{self.name}_sum{lbl} {_num(child.sum)}")
+            out.append(f"{self.name}_count{lbl} {child.count}")
+        return out
+
+class Collected(_Metric):
+    """Gauge or counter read at scrape time from state another object already keeps.
+
+    fn returns a number, or {label-value tuple: number} when labelnames are given.
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Any], kind: str = "gauge", labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception:
+            return []  # a broken source must not take the whole scrape down
+        out = super().render()
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for values, v in items:
+            if v is not None:
+                out.append(f"{self.name}{_labels(self.labelnames, values)} {_num(v)}")
+        return out
+
+class CollectedGroup:
+    """Several gauges filled from one fn() call per scrape, for sources that cost something to read.
+
+    fields maps a key of the dict fn returns to (metric name, help); missing or None keys are skipped.
+    """
+
+    def __init__(self, fn: Callable[[], Dict[str, Any]], fields: Dict[str, Tuple[str, str]]):
+        self.fn = fn
+        self.fields = fields
+        REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+        out: List[str] = []
+        for key, (name, help) in self.fields.items():
+            v = values.get(key)
+            if v is not None:
+                out += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {_num(v)}"]
+        return out
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,293 @@
+import os, sys, json, time, sqlite3, threading
+from collections import OrderedDict, deque
+from typing import Callable, Optional, Dict, Any, Tuple, List
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").strip().lower()  # memory | sqlite | redis
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(24 * 3600)))  # idle seconds before a session is dropped
+SESSION_HISTORY = int(os.getenv("SESSION_HISTORY", "20"))  # messages kept per session
+SESSION_SQLITE_FILE = os.getenv("SESSION_SQLITE_FILE", os.path.join(DATA_DIR, "sessions.sqlite"))
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+
+_DEQUE_BYTES = sys.getsizeof(deque())
+
+class Session:
+    __slots__ = ("session_id", "created_at", "last_seen", "hair_type", "concern", "finish_or_hold",
+                 "history", "unsaved", "content_bytes", "on_resize")
+
+    def __init__(self, session_id: str, max_history: int = SESSION_HISTORY):
+        now = time.time()
+        self.session_id = session_id
+        self.created_at = now
+        self.last_seen = now
+        self.hair_type: Optional[str] = None
+        self.concern: Optional[str] = None
+        self.finish_or_hold: Optional[str] = None
+        self.history: "deque[Tuple[str, str]]" = deque(maxlen=max_history)
+        self.unsaved: List[Tuple[str, str]] = []  # messages added since the last save
+        self.content_bytes = 0  # sizeof every message kept in history, maintained as it changes
+        # called with (messages added, bytes added) so a store can keep running totals
+        self.on_resize: Optional[Callable[[int, int], None]] = None
+
+    def add_message(self, role: str, content: str) -> None:
+        h = self.history
+        dropped = h[0][1] if h.maxlen and len(h) == h.maxlen else None
+        h.append((role, content))
+        self.unsaved.append((role, content))
+        if not h.maxlen:
+            return
+        added = sys.getsizeof(content) - (sys.getsizeof(dropped) if dropped is not None else 0)
+        self.content_bytes += added
+        if self.on_resize is not None:
+            self.on_resize(dropped is None, added)
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "created_at": self.created_at,
+            "last_seen": self.last_seen,
+            "hair_type": self.hair_type,
+            "concern": self.concern,
+            "finish_or_hold": self.finish_or_hold,
+        }
+
+    def restore(self, state: Dict[str, Any], history: List[Tuple[str, str]]) -> None:
+        self.created_at = float(state.get("created_at") or self.created_at)
+        self.hair_type = state.get("hair_type") or None
+        self.concern = state.get("concern") or None
+        self.finish_or_hold = state.get("finish_or_hold") or None
+        self.history.extend(history)
+        self.content_bytes = sum(sys.getsizeof(content) for _, content in self.history)
+
+    def approx_bytes(self) -> int:
+        # roles are interned literals, so only message text counts; the deque is
+        # taken at its one-block size so the figure only changes with content_bytes
+        return sys.getsizeof(self) + _DEQUE_BYTES + sys.getsizeof(self.session_id) + self.content_bytes
+
+class SessionStore:
+    """Loads a session at the start of a request and saves it once at the end."""
+
+    blocking = False  # True when load/save do I/O and should run off the event loop
+
+    def load(self, session_id: str) -> Session:
+        raise NotImplementedError
+
+    def save(self, session: Session) -> None:
+        raise NotImplementedError
+
+    def touch(self, session: Session) -> None:
+        """Mark a session held across requests (an open WebSocket) as in use.
+
+        Stores that refresh expiry on every save need nothing more.
+        """
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+class MemorySessionStore(SessionStore):
+    """Process-local LRU capped at max_entries, dropping any session idle longer than ttl seconds.
+
+    Message and byte totals are kept as sessions change, so stats() never walks them.
+    """
+
+    def __init__(self, max_entries: int = SESSION_MAX, ttl: float = SESSION_TTL, max_history: int = SESSION_HISTORY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_history = max_history
+        self.evicted = 0
+        self.expired = 0
+        self.history_messages = 0
+        self.approx_bytes = 0
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _resized(self, messages: int, nbytes: int) -> None:
+        with self._lock:
+            self.history_messages += messages
+            self.approx_bytes += nbytes
+
+    def _drop(self, s: Session) -> None:
+        # caller holds the lock; a request still holding s no longer moves the totals
+        s.on_resize = None
+        self.history_messages -= len(s.history)
+        self.approx_bytes -= s.approx_bytes()
+
+    def _expire(self, now: float) -> None:
+        # least recently seen sessions sit at the front, so stop at the first live one
+        while self._sessions:
+            sid, s = next(iter(self._sessions.items()))
+            if now - s.last_seen <= self.ttl:
+                break
+            del self._sessions[sid]
+            self._drop(s)
+            self.expired += 1
+
+    def load(self, session_id: str) -> Session:
+        now = time.time()
+        with self._lock:
+            if self.ttl > 0:
+                self._expire(now)
+            s = self._sessions.get(session_id)
+            if s is None:
+                s = Session(session_id, self.max_history)
+                self._adopt(s)
+            else:
+                self._sessions.move_to_end(session_id)
+            s.last_seen = now
+            return s
+
+    def _adopt(self, s: Session) -> None:
+        # caller holds the lock
+        old = self._sessions.pop(s.session_id, None)
+        if old is not None:
+            self._drop(old)
+        self._sessions[s.session_id] = s
+        s.on_resize = self._resized
+        self.history_messages += len(s.history)
+        self.approx_bytes += s.approx_bytes()
+        while len(self._sessions) > self.max_entries:
+            self._drop(self._sessions.popitem(last=False)[1])
+            self.evicted += 1
+
+    def touch(self, session: Session) -> None:
+        with self._lock:
+            session.last_seen = time.time()
+            if self._sessions.get(session.session_id) is session:
+                self._sessions.move_to_end(session.session_id)
+            else:
+                self._adopt(session)  # dropped while the socket sat idle; it is still the live copy
+
+    def save(self, session: Session) -> None:
+        session.unsaved.clear()  # the record itself is resident
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_entries,
+                "history_messages": self.history_messages,
+                "approx_bytes": self.approx_bytes,
+                "evicted": self.evicted,
+                "expired": self.expired,
+            }
+
+class SqliteSessionStore(SessionStore):
+    """Sessions in a WAL-mode sqlite file, shared by every worker process on the host."""
+
+    blocking = True
+
+    def __init__(self, path: str = SESSION_SQLITE_FILE, max_entries: int = SESSION_MAX, ttl: float = SESSION_TTL,
+                 max_history: int = SESSION_HISTORY, prune_every: int = 500):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_history = max_history
+        self.prune_every = prune_every
+        self._saves = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, last_seen REAL NOT NULL, state TEXT NOT NULL, history TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)")
+        self._db.commit()
+
+    def load(self, session_id: str) -> Session:
+        s = Session(session_id, self.max_history)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT last_seen, state, history FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is not None and (self.ttl <= 0 or s.last_seen - row[0] <= self.ttl):
+            s.restore(json.loads(row[1]), [tuple(m) for m in json.loads(row[2])])
+        return s
+
+    def save(self, session: Session) -> None:
+        session.last_seen = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (id, last_seen, state, history) VALUES (?, ?, ?, ?)",
+                (session.session_id, session.last_seen, json.dumps(session.state()), json.dumps(list(session.history))),
+            )
+            self._saves += 1
+            if self._saves % self.prune_every == 0:
+                self._prune(session.last_seen)
+            self._db.commit()
+        session.unsaved.clear()
+
+    def _prune(self, now: float) -> None:
+        if self.ttl > 0:
+            self._db.execute("DELETE FROM sessions WHERE last_seen < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM sessions WHERE id IN "
+            "(SELECT id FROM sessions ORDER BY last_seen DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"backend": "sqlite", "sessions": count, "max_sessions": self.max_entries}
+
+class RedisSessionStore(SessionStore):
+    """Sessions in Redis (or anything speaking its protocol): one pipelined round trip per load and per save."""
+
+    blocking = True
+
+    def __init__(self, url: str = SESSION_REDIS_URL, ttl: float = SESSION_TTL, max_history: int = SESSION_HISTORY,
+                 prefix: str = "ortahaus:session:", client: Any = None):
+        if client is None:
+            import redis  # optional dependency, only needed for SESSION_BACKEND=redis
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.ttl = ttl
+        self.max_history = max_history
+        self.prefix = prefix
+
+    def _keys(self, session_id: str) -> Tuple[str, str]:
+        return self.prefix + session_id, self.prefix + session_id + ":history"
+
+    def load(self, session_id: str) -> Session:
+        state_key, history_key = self._keys(session_id)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(state_key)
+        pipe.lrange(history_key, -self.max_history, -1)
+        state, history = pipe.execute()
+        s = Session(session_id, self.max_history)
+        if state:
+            s.restore(state, [tuple(json.loads(m)) for m in history])
+        return s
+
+    def save(self, session: Session) -> None:
+        session.last_seen = time.time()
+        state_key, history_key = self._keys(session.session_id)
+        state = {k: ("" if v is None else v) for k, v in session.state().items()}
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(state_key, mapping=state)
+        if session.unsaved:
+            pipe.rpush(history_key, *[json.dumps(m) for m in session.unsaved])
+            pipe.ltrim(history_key, -self.max_history, -1)
+        if self.ttl > 0:
+            pipe.expire(state_key, int(self.ttl))
+            pipe.expire(history_key, int(self.ttl))
+        pipe.execute()
+        session.unsaved.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "prefix": self.prefix}
+
+def make_session_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    if backend == "sqlite":
+        return SqliteSessionStore()
+    if backend == "redis":
+        return RedisSessionStore()
+    return MemorySessionStore()
@@ -0,0 +1,164 @@
+import os, time, queue, sqlite3, threading
+from array import array
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
+
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", str(30 * 86400)))  # seconds; 0 = never expire
+# set EMBED_CACHE_FILE="" to keep the cache in memory only
+EMBED_CACHE_FILE = os.getenv("EMBED_CACHE_FILE", os.path.join(DATA_DIR, "embeddings.sqlite"))
+
+def normalize_text(text: str) -> str:
+    return " ".join((text or "").split())
+
+class EmbeddingCache:
+    """In-memory LRU of embeddings keyed by (model, normalized text), optionally backed by sqlite.
+
+    The sqlite file is shared with the indexer, so a lookup can wait on its
+    write lock: async callers probe get_memory() inline and run get() on a
+    thread. With write_behind, put_many() only updates memory and a background
+    thread persists the rows.
+    """
+
+    def __init__(self, max_entries: int = EMBED_CACHE_SIZE, ttl: float = EMBED_CACHE_TTL, path: Optional[str] = None,
+                 write_behind: bool = False):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path or None
+        self.hits = 0
+        self.misses = 0
+        self._mem: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()  # memory only; never held across sqlite calls
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._pending: "queue.Queue[List[Tuple[str, str, float, bytes]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            # WAL lets the server read while the indexer writes the same file
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text TEXT NOT NULL, created REAL NOT NULL, vec BLOB NOT NULL, "
+                "PRIMARY KEY (model, text))"
+            )
+            self._db.commit()
+            if write_behind:
+                self._writer = threading.Thread(target=self._write_loop, name="embed-cache-writer", daemon=True)
+                self._writer.start()
+
+    @classmethod
+    def from_env(cls, write_behind: bool = False) -> "EmbeddingCache":
+        return cls(EMBED_CACHE_SIZE, EMBED_CACHE_TTL, EMBED_CACHE_FILE, write_behind=write_behind)
+
+    @property
+    def persistent(self) -> bool:
+        return self._db is not None
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl > 0 and now - created > self.ttl
+
+    def _remember(self, key: Tuple[str, str], created: float, vec: List[float]) -> None:
+        self._mem[key] = (created, vec)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def _probe(self, key: Tuple[str, str], now: float) -> Optional[List[float]]:
+        entry = self._mem.get(key)
+        if entry is not None and not self._expired(entry[0], now):
+            self._mem.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        return None
+
+    def get_memory(self, model: str, text: str) -> Optional[List[float]]:
+        """LRU probe only. A miss is counted here only when there is no sqlite to fall back to."""
+        with self._lock:
+            vec = self._probe((model, normalize_text(text)), time.time())
+            if vec is None and self._db is None:
+                self.misses += 1
+            return vec
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        if self._db is None:
+            return self.get_memory(model, text)
+        key = (model, normalize_text(text))
+        now = time.time()
+        with self._lock:
+            vec = self._probe(key, now)
+        if vec is not None:
+            return vec
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT created, vec FROM embeddings WHERE model = ? AND text = ?", key
+            ).fetchone()
+        with self._lock:
+            if row is not None and not self._expired(row[0], now):
+                vec = array("f", row[1]).tolist()
+                self._remember(key, row[0], vec)
+                self.hits += 1
+                return vec
+            self.misses += 1
+            return None
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        return [self.get(model, t) for t in texts]
+
+    def put(self, model: str, text: str, vec: List[float]) -> None:
+        self.put_many(model, [text], [vec])
+
+    def put_many(self, model: str, texts: List[str], vecs: List[List[float]]) -> None:
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vec in zip(texts, vecs):
+                key = (model, normalize_text(text))
+                self._remember(key, now, list(vec))
+                rows.append((key[0], key[1], now, array("f", vec).tobytes()))
+        if self._db is None or not rows:
+            return
+        if self._writer is not None:
+            self._pending.put(rows)
+        else:
+            self._write(rows)
+
+    def _write(self, rows: List[Tuple[str, str, float, bytes]]) -> None:
+        with self._db_lock:
+            self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def _write_loop(self) -> None:
+        while True:
+            batches = [self._pending.get()]
+            while True:
+                try:
+                    batches.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write([row for rows in batches for row in rows])
+            except sqlite3.Error as e:
+                print(f"Embedding cache write of {len(batches)} batches failed: {e}")  # memory still has them
+            finally:
+                for _ in batches:
+                    self._pending.task_done()
+
+    def flush(self) -> None:
+        """Block until write-behind rows are on disk."""
+        if self._writer is not None:
+            self._pending.join()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._mem),
+            "max_entries": self.max_entries,
+            "persistent": self._db is not None,
+        }
@@ -0,0 +1,135 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import httpx
+
+# One pooled keep-alive client per upstream, shared by every request in the process,
+# so a chat turn reuses an open TLS connection instead of handshaking again.
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "32"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "16"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "90"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+PINECONE_POOL_SIZE = int(os.getenv("PINECONE_POOL_SIZE", "16"))
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (httpx[http2])
+    except ImportError:
+        return False
+    return True
+
+# HTTP/2 multiplexes concurrent requests over one connection; needs `pip install httpx[http2]`
+HTTP2 = os.getenv("HTTP2", "1") == "1" and http2_available()
+
+class PoolStats:
+    """Request/connection counters for one pooled client, fed by httpcore trace events."""
+
+    def __init__(self, name: str, max_connections: int = HTTP_MAX_CONNECTIONS):
+        self.name = name
+        self.max_connections = max_connections
+        self.requests = 0
+        self.errors = 0
+        self.connects = 0
+        self.tls_handshakes = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.pool = None  # httpcore pool, when the client is ours
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def trace(self, event: str, info: Dict[str, Any]) -> None:
+        if event == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connects += 1
+        elif event == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    async def atrace(self, event: str, info: Dict[str, Any]) -> None:
+        self.trace(event, info)
+
+    def stats(self) -> Dict[str, Any]:
+        out = {
+            "requests": self.requests,
+            "errors": self.errors,
+            "connects": self.connects,
+            "tls_handshakes": self.tls_handshakes,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "max_connections": self.max_connections,
+        }
+        conns = getattr(self.pool, "connections", None)
+        if conns is not None:
+            idle = sum(1 for c in conns if c.is_idle())
+            out.update(open=len(conns), idle=idle, active=len(conns) - idle,
+                       utilization=round((len(conns) - idle) / self.max_connections, 3))
+            if self.requests:
+                out["reuse_ratio"] = round(1 - self.connects / self.requests, 3)
+        return out
+
+class _TracedAsyncTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+        stats.pool = self._pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions["trace"] = self.stats.atrace
+        with self.stats.track():
+            return await super().handle_async_request(request)
+
+class _TracedTransport(httpx.HTTPTransport):
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+        stats.pool = self._pool
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions["trace"] = self.stats.trace
+        with self.stats.track():
+            return super().handle_request(request)
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+def _timeout(read_timeout: Optional[float]) -> httpx.Timeout:
+    return httpx.Timeout(read_timeout or HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+def async_http_client(stats: PoolStats, read_timeout: Optional[float] = None) -> httpx.AsyncClient:
+    transport = _TracedAsyncTransport(stats, limits=_limits(), http2=HTTP2)
+    return httpx.AsyncClient(transport=transport, timeout=_timeout(read_timeout))
+
+def http_client(stats: PoolStats, read_timeout: Optional[float] = None) -> httpx.Client:
+    transport = _TracedTransport(stats, limits=_limits(), http2=HTTP2)
+    return httpx.Client(transport=transport, timeout=_timeout(read_timeout))
+
+def pinecone_client(api_key: str, pool_size: int = PINECONE_POOL_SIZE, timeout: Optional[float] = None):
+    """Pinecone client with a sized connection pool; older SDKs without the knobs keep their defaults."""
+    from pinecone import Pinecone
+    try:
+        return Pinecone(api_key=api_key or None, connection_pool_maxsize=pool_size,
+                        timeout=timeout or HTTP_READ_TIMEOUT)
+    except TypeError:
+        return Pinecone(api_key=api_key or None)
@@ -0,0 +1,155 @@
+import os, re, json, math
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Tuple
+
+from shared.reloadable import Reloadable
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
+# the scraper's products.json (or .jsonl), same file the indexer reads
+PRODUCTS_FILE = os.getenv("PRODUCTS_FILE", os.path.join(DATA_DIR, "products.json"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# title terms count this many times, so a name match outranks a passing mention
+TITLE_WEIGHT = 3
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from i in is it its me my of on or so the this to with you your".split()
+)
+# dropped from product titles before they are matched as names in a message
+NAME_NOISE = frozenset(("ortahaus", "the", "by"))
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+def product_id(it: Dict[str, Any]) -> str:
+    return it.get("id") or it.get("url") or ""
+
+def product_hit(it: Dict[str, Any], score: float) -> Dict[str, Any]:
+    # same shape as shared.recs.hit_from_match, so lexical and vector hits mix freely
+    return {
+        "id": product_id(it),
+        "score": score,
+        "title": it.get("title") or "",
+        "url": it.get("url") or "",
+        "how_to_use": it.get("how_to_use") or "",
+        "ingredients": it.get("ingredients") or "",
+        "bullets": list(it.get("bullets") or []),
+    }
+
+class _Built:
+    """Everything search() needs, built off to the side and installed in one assignment."""
+
+    __slots__ = ("products", "postings", "idf", "norm", "names", "max_name")
+
+    def __init__(self, items: List[Dict[str, Any]]):
+        products, seen = [], set()
+        for it in items:
+            pid = product_id(it)
+            if pid and pid not in seen:
+                seen.add(pid)
+                products.append(it)
+
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths: List[int] = []
+        names: Dict[Tuple[str, ...], int] = {}
+        for doc, it in enumerate(products):
+            tf: Dict[str, int] = defaultdict(int)
+            for t in tokenize(it.get("title", "")):
+                tf[t] += TITLE_WEIGHT
+            body = " ".join([
+                it.get("description") or "",
+                " ".join(it.get("bullets") or []),
+                it.get("ingredients") or "",
+            ])
+            for t in tokenize(body):
+                tf[t] += 1
+            for t, n in tf.items():
+                postings[t].append((doc, n))
+            lengths.append(sum(tf.values()))
+
+            # a product is "named" by its title words in order; one-word titles
+            # are too easily said in passing ("hold", "volume") to count
+            name = tuple(t for t in TOKEN_RE.findall((it.get("title") or "").lower())
+                         if t not in NAME_NOISE and not any(c.isdigit() for c in t))
+            if len(name) >= 2:
+                names.setdefault(name, doc)
+
+        n_docs = len(products)
+        avg = (sum(lengths) / n_docs) if n_docs else 1.0
+        self.products = products
+        self.postings = dict(postings)
+        self.idf = {t: math.log(1 + (n_docs - len(p) + 0.5) / (len(p) + 0.5)) for t, p in postings.items()}
+        # per-document length normalization, precomputed once
+        self.norm = [BM25_K1 * (1 - BM25_B + BM25_B * n / avg) for n in lengths]
+        self.names = names
+        self.max_name = max((len(n) for n in names), default=0)
+
+class LexicalIndex(Reloadable):
+    """In-memory BM25 over title, description, bullets and ingredients, plus exact product-name lookup.
+
+    reload() rebuilds it from the products file when that changes.
+    """
+
+    def __init__(self, path: str = PRODUCTS_FILE, check_every: float = 30.0, load: bool = True):
+        super().__init__(path, check_every)
+        self._built = _Built([])
+        if load:
+            self.reload()
+
+    def _load(self) -> _Built:
+        with open(self.path, "r", encoding="utf-8") as f:
+            if self.path.endswith(".jsonl"):
+                items = [json.loads(line) for line in f if line.strip()]
+            else:
+                items = json.load(f)
+        return _Built(items)
+
+    def _swap(self, built: _Built) -> None:
+        self._built = built
+
+    @property
+    def products(self) -> List[Dict[str, Any]]:
+        return self._built.products
+
+    def search(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+        b = self._built
+        scores: Dict[int, float] = defaultdict(float)
+        for t in set(tokenize(query)):
+            idf = b.idf.get(t)
+            if idf is None:
+                continue
+            for doc, tf in b.postings[t]:
+                scores[doc] += idf * tf * (BM25_K1 + 1) / (tf + b.norm[doc])
+        best = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+        return [product_hit(b.products[doc], round(s, 4)) for doc, s in best]
+
+    def named_product(self, text: str) -> Optional[Dict[str, Any]]:
+        """The product whose full name appears in text (longest name wins), if any."""
+        b = self._built
+        if not b.names:
+            return None
+        words = TOKEN_RE.findall((text or "").lower())
+        for n in range(min(b.max_name, len(words)), 1, -1):
+            for i in range(len(words) - n + 1):
+                doc = b.names.get(tuple(words[i:i + n]))
+                if doc is not None:
+                    return product_hit(b.products[doc], 1.0)
+        return None
+
+    def __len__(self) -> int:
+        return len(self._built.products)
+
+def rrf_fuse(rankings: List[List[Dict[str, Any]]], top_k: int, k: int = RRF_K) -> List[Dict[str, Any]]:
+    """Reciprocal-rank fusion: score = sum of 1 / (k + rank) over the rankings a hit appears in."""
+    fused: Dict[str, float] = defaultdict(float)
+    first: Dict[str, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            key = hit["id"] or hit["url"]
+            fused[key] += 1.0 / (k + rank)
+            first.setdefault(key, hit)
+    best = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+    return [{**first[key], "score": round(score, 6)} for key, score in best]
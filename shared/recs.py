@@ -0,0 +1,83 @@
+import os, json, time
+from typing import List, Dict, Any, Optional, Tuple
+
+from shared.reloadable import Reloadable
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
+RECS_FILE = os.getenv("RECS_FILE", os.path.join(DATA_DIR, "recommendations.json"))
+RECS_TOP_K = int(os.getenv("RECS_TOP_K", "5"))
+
+HAIR_TYPES = {"straight","wavy","curly","coily","fine","thick","thin","medium"}
+CONCERNS = {
+    "volume":"volume",
+    "volumize":"volume",
+    "hold":"hold",
+    "strong hold":"hold",
+    "matte":"matte",
+    "shine":"shine",
+    "gloss":"shine",
+    "frizz":"frizz",
+    "definition":"definition",
+    "hydrate":"hydration",
+    "hydration":"hydration",
+    "moisture":"hydration",
+    "oily":"oil control",
+    "greasy":"oil control",
+    "sweat":"sweat",
+    "texture":"texture",
+}
+
+def canonical_hair_type(h: str) -> str:
+    return "thin" if h == "fine" else h
+
+def combos() -> List[Tuple[str, str]]:
+    htypes = sorted({canonical_hair_type(h) for h in HAIR_TYPES})
+    concerns = sorted(set(CONCERNS.values()))
+    return [(h, c) for h in htypes for c in concerns]
+
+def build_query(htype: str, concern: str) -> str:
+    return f"Ortahaus product for {htype} hair; primary concern: {concern}. Return best match."
+
+def rec_key(htype: str, concern: str) -> str:
+    return f"{htype}|{concern}"
+
+def hit_from_match(m: Any) -> Dict[str, Any]:
+    md = m.get("metadata", {}) if isinstance(m, dict) else (m.metadata or {})
+    return {
+        "id": (m.get("id") if isinstance(m, dict) else getattr(m, "id", None)) or md.get("url") or "",
+        "score": m.get("score") if isinstance(m, dict) else getattr(m, "score", None),
+        "title": md.get("title") or "",
+        "url": md.get("url") or "",
+        "how_to_use": md.get("how_to_use") or "",
+        "ingredients": md.get("ingredients") or "",
+        "bullets": list(md.get("bullets") or []),
+    }
+
+def save_table(table: Dict[str, List[Dict[str, Any]]], path: str = RECS_FILE) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"built_at": time.time(), "recs": table}, f, ensure_ascii=False)
+    os.replace(tmp, path)  # readers never see a half-written table
+
+class RecTable(Reloadable):
+    """Precomputed top-k hits per (hair_type, concern), reloaded when the indexer rewrites the file."""
+
+    def __init__(self, path: str = RECS_FILE, check_every: float = 5.0, load: bool = True):
+        super().__init__(path, check_every)
+        self._recs: Dict[str, List[Dict[str, Any]]] = {}
+        if load:
+            self.reload()
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f).get("recs") or {}
+
+    def _swap(self, recs: Dict[str, List[Dict[str, Any]]]) -> None:
+        self._recs = recs
+
+    def get(self, htype: str, concern: str) -> Optional[List[Dict[str, Any]]]:
+        return self._recs.get(rec_key(htype, concern)) or None
+
+    def __len__(self) -> int:
+        return len(self._recs)
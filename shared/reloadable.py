@@ -0,0 +1,49 @@
+import os, time, threading
+from typing import Any, Optional
+
+class Reloadable:
+    """In-memory data built from a file and rebuilt when the file's mtime changes.
+
+    Subclasses implement _load(), which reads and builds everything without
+    touching self, and _swap(state), which installs the result with a single
+    attribute assignment so readers on other threads see either the old data or
+    the new, never a mix. reload() does the disk work and is meant to run on a
+    worker thread; readers never trigger it themselves. due() says whether
+    check_every seconds have passed since the last check.
+    """
+
+    def __init__(self, path: str, check_every: float):
+        self.path = path
+        self.check_every = check_every
+        self._mtime = 0.0
+        self._checked_at = 0.0
+        self._reload_lock = threading.Lock()
+
+    def _load(self) -> Optional[Any]:
+        raise NotImplementedError
+
+    def _swap(self, state: Any) -> None:
+        raise NotImplementedError
+
+    def due(self) -> bool:
+        return time.monotonic() - self._checked_at >= self.check_every
+
+    def reload(self) -> bool:
+        """Rebuild if the file changed; True when new data was installed."""
+        with self._reload_lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                return False
+            if mtime == self._mtime:
+                return False
+            try:
+                state = self._load()
+            except (OSError, ValueError):
+                return False  # keep serving the previous data
+            if state is None:
+                return False  # not ready yet (e.g. caught mid-write); retried next check
+            self._swap(state)
+            self._mtime = mtime
+            return True
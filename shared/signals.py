@@ -0,0 +1,41 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from shared.recs import HAIR_TYPES, CONCERNS, canonical_hair_type
+
+# phrase -> ("hair_type" | "concern", canonical value)
+SIGNALS: Dict[str, Tuple[str, str]] = {h: ("hair_type", canonical_hair_type(h)) for h in HAIR_TYPES}
+SIGNALS.update({k: ("concern", v) for k, v in CONCERNS.items()})
+
+# One alternation compiled at import. Longer phrases come first so that at any
+# position "strong hold" wins over "hold".
+SIGNAL_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(k) for k in sorted(SIGNALS, key=lambda k: (-len(k), k))) + r")\b",
+    re.IGNORECASE,
+)
+
+# every word of every signal phrase, plus chat filler; what is left of a message
+# after dropping these is what the user asked for beyond (hair type, concern)
+SIGNAL_WORDS = frozenset(w for k in SIGNALS for w in k.lower().split())
+CHAT_WORDS = frozenset(
+    "hair hi hey hello thanks thank please want need looking look something anything some any "
+    "product products recommend recommendation suggest help can could would do does have has got "
+    "get what which good best really very just also but im am m s t like use using".split()
+)
+
+def extra_terms(words: Iterable[str]) -> List[str]:
+    """The words left once signal vocabulary and chat filler are dropped."""
+    return [w for w in words if w not in SIGNAL_WORDS and w not in CHAT_WORDS]
+
+def extract_signals(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """(hair_type, concern) from one scan of text; the first mention of each kind wins."""
+    htype = concern = None
+    for m in SIGNAL_RE.finditer(text or ""):
+        kind, value = SIGNALS[m.group(0).lower()]
+        if kind == "hair_type":
+            htype = htype or value
+        else:
+            concern = concern or value
+        if htype and concern:
+            break
+    return htype, concern
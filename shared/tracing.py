@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+import contextvars
+from typing import Any, Callable, Dict, List, Optional
+
+# Lightweight tracing with OpenTelemetry's data model: 128-bit trace ids, 64-bit
+# span ids, W3C `traceparent` propagation. Spans are exported as OTLP/JSON, one
+# ExportTraceServiceRequest per line (a finished trace is written together), which
+# is what the collector's otlpjsonfile receiver reads.
+# Sampling is decided once per trace at the root; spans outside a sampled trace
+# cost a context-variable lookup.
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
+
+# fraction of root spans (chat turns, scraper/indexer runs) recorded; 0 disables tracing
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+# "file" (JSONL at TRACE_FILE) or "console" (stderr)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "file").strip().lower()
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(DATA_DIR, "traces.jsonl"))
+
+# OTLP/JSON encodes enums as their integer values
+_KINDS = {"SPAN_KIND_INTERNAL": 1, "SPAN_KIND_SERVER": 2, "SPAN_KIND_CLIENT": 3,
+          "SPAN_KIND_PRODUCER": 4, "SPAN_KIND_CONSUMER": 5}
+_STATUS_CODES = {"STATUS_CODE_UNSET": 0, "STATUS_CODE_OK": 1, "STATUS_CODE_ERROR": 2}
+
+_current: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("current_span", default=None)
+_service = "ortahaus"
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "start_ns", "end_ns",
+                 "attributes", "status", "status_message", "is_root", "_token")
+
+    sampled = True
+
+    def __init__(self, name: str, trace_id: str, parent_id: str, kind: str, attributes: Dict[str, Any], is_root: bool):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes
+        self.status = "STATUS_CODE_UNSET"
+        self.status_message = ""
+        self.is_root = is_root
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self._token = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def error(self, exc: BaseException) -> None:
+        self.status = "STATUS_CODE_ERROR"
+        self.status_message = f"{type(exc).__name__}: {exc}"
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        out = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": _KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _key_values(self.attributes),
+            "status": {"code": _STATUS_CODES[self.status]},
+        }
+        if self.parent_id:
+            out["parentSpanId"] = self.parent_id
+        if self.status_message:
+            out["status"]["message"] = self.status_message
+        return out
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if isinstance(exc, Exception):
+            self.error(exc)
+        self.end_ns = time.time_ns()
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            _current.set(None)  # exited from another context (e.g. a generator closed elsewhere)
+        _exporter.export(self)
+        return False
+
+def _any_value(v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    if isinstance(v, (list, tuple)):
+        return {"arrayValue": {"values": [_any_value(x) for x in v if x is not None]}}
+    return {"stringValue": v if isinstance(v, str) else str(v)}
+
+def _key_values(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # OTel attributes have no null; an unset value is simply left out
+    return [{"key": k, "value": _any_value(v)} for k, v in attributes.items() if v is not None]
+
+class _NoopSpan:
+    """Stands in for every span outside a sampled trace; never touches the context."""
+
+    sampled = False
+    trace_id = span_id = ""
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def error(self, exc: BaseException) -> None:
+        pass
+
+    def traceparent(self) -> str:
+        return ""
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+_NOOP = _NoopSpan()
+
+class _Exporter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buf: List[Dict[str, Any]] = []
+        self._file = None
+
+    def export(self, span: Span) -> None:
+        out = span.to_otlp()
+        with self._lock:
+            self._buf.append(out)
+            if span.is_root or len(self._buf) >= 256:
+                self._flush()
+
+    def _flush(self) -> None:
+        if not self._buf:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": _key_values({"service.name": _service})},
+            "scopeSpans": [{"scope": {"name": "shared.tracing"}, "spans": self._buf}],
+        }]}
+        data = json.dumps(request, ensure_ascii=False, default=str) + "\n"
+        self._buf = []
+        if TRACE_EXPORTER == "console":
+            sys.stderr.write(data)
+            sys.stderr.flush()
+            return
+        if self._file is None:
+            os.makedirs(os.path.dirname(TRACE_FILE) or ".", exist_ok=True)
+            self._file = open(TRACE_FILE, "a", encoding="utf-8")
+        self._file.write(data)
+        self._file.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+_exporter = _Exporter()
+
+def init(service_name: str) -> None:
+    global _service
+    _service = service_name
+
+def enabled() -> bool:
+    return TRACE_SAMPLE_RATE > 0
+
+def current():
+    """The active span, or a no-op span, so callers can always .set() on it."""
+    return _current.get() or _NOOP
+
+def parse_traceparent(header: Optional[str]):
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header, or None."""
+    parts = (header or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+def trace(name: str, traceparent: Optional[str] = None, kind: str = "SPAN_KIND_INTERNAL", **attributes: Any):
+    """Root span of a new trace (continuing the caller's if a traceparent is given), sampled at TRACE_SAMPLE_RATE."""
+    if TRACE_SAMPLE_RATE <= 0:
+        return _NOOP
+    remote = parse_traceparent(traceparent)
+    if remote is not None:
+        trace_id, parent_id, sampled = remote  # follow the caller's sampling decision
+    else:
+        trace_id, parent_id = f"{random.getrandbits(128):032x}", ""
+        sampled = random.random() < TRACE_SAMPLE_RATE
+    if not sampled:
+        return _NOOP
+    return Span(name, trace_id, parent_id, kind, attributes, is_root=True)
+
+def span(name: str, **attributes: Any):
+    """Child of the current span; a no-op outside a sampled trace."""
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return _NOOP
+    return Span(name, parent.trace_id, parent.span_id, "SPAN_KIND_INTERNAL", attributes, is_root=False)
+
+def bind(fn: Callable) -> Callable:
+    """Run fn (typically on a worker thread) as if called under the current span."""
+    parent = _current.get()
+    if parent is None:
+        return fn
+
+    def run(*args, **kwargs):
+        token = _current.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+def flush() -> None:
+    _exporter.flush()
@@ -0,0 +1,108 @@
+import os, json
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+from shared.recs import hit_from_match
+from shared.reloadable import Reloadable
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data"))
+
+# "pinecone" (default) or "local" (in-process NumPy index built by the indexer)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").strip().lower()
+LOCAL_INDEX_PREFIX = os.getenv("LOCAL_INDEX_PREFIX", os.path.join(DATA_DIR, "local_index"))
+
+class PineconeIndex:
+    blocking = True  # SDK calls do network I/O; callers should offload them
+
+    def __init__(self, index: Any, namespace: str, stats: Any = None):
+        self.index = index
+        self.namespace = namespace
+        self.stats = stats  # optional shared.http_pool.PoolStats
+
+    def query(self, vec: List[float], top_k: int) -> List[Dict[str, Any]]:
+        if self.stats is None:
+            res = self.index.query(namespace=self.namespace, vector=vec, top_k=top_k, include_metadata=True)
+        else:
+            with self.stats.track():
+                res = self.index.query(namespace=self.namespace, vector=vec, top_k=top_k, include_metadata=True)
+        return [hit_from_match(m) for m in res.matches or []]
+
+class LocalIndex(Reloadable):
+    """Exact cosine search over an L2-normalized float32 matrix held in memory.
+
+    When loaded from a snapshot, reload() picks up the files the indexer rewrites.
+    """
+
+    blocking = False
+
+    def __init__(self, ids: List[str], metadata: List[Dict[str, Any]], matrix: np.ndarray,
+                 prefix: str = LOCAL_INDEX_PREFIX, check_every: float = 5.0):
+        super().__init__(prefix + ".json", check_every)  # the .json is renamed into place last
+        self.prefix = prefix
+        self._snap: Tuple[List[str], List[Dict[str, Any]], np.ndarray] = (
+            ids, metadata, np.ascontiguousarray(matrix, dtype=np.float32))
+
+    @classmethod
+    def load(cls, prefix: str = LOCAL_INDEX_PREFIX, check_every: float = 5.0) -> "LocalIndex":
+        index = cls([], [], np.zeros((0, 0), dtype=np.float32), prefix=prefix, check_every=check_every)
+        index.reload()
+        return index
+
+    def _load(self):
+        matrix = np.load(self.prefix + ".npy")
+        with open(self.prefix + ".json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if len(meta["ids"]) != matrix.shape[0]:
+            return None  # read between the indexer's two renames
+        return meta["ids"], meta["metadata"], np.ascontiguousarray(matrix, dtype=np.float32)
+
+    def _swap(self, snap) -> None:
+        self._snap = snap
+
+    @property
+    def ids(self) -> List[str]:
+        return self._snap[0]
+
+    @property
+    def metadata(self) -> List[Dict[str, Any]]:
+        return self._snap[1]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._snap[2]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def query(self, vec: List[float], top_k: int) -> List[Dict[str, Any]]:
+        ids, metadata, matrix = self._snap  # one consistent snapshot even if reload() swaps mid-query
+        n = len(ids)
+        if n == 0 or top_k <= 0:
+            return []
+        q = np.asarray(vec, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if norm:
+            q = q / norm
+        scores = matrix @ q
+        k = min(top_k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            hit_from_match({"id": ids[i], "score": float(scores[i]), "metadata": metadata[i]})
+            for i in top
+        ]
+
+def save_local_index(ids: List[str], metadata: List[Dict[str, Any]], vectors: List[List[float]],
+                     prefix: str = LOCAL_INDEX_PREFIX) -> None:
+    os.makedirs(os.path.dirname(prefix), exist_ok=True)
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1) if ids else np.zeros((0, 0), np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = matrix / norms
+    # write to temp names and swap so a running server never loads a torn pair
+    np.save(prefix + ".tmp.npy", matrix)
+    with open(prefix + ".tmp.json", "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "metadata": metadata}, f, ensure_ascii=False)
+    os.replace(prefix + ".tmp.npy", prefix + ".npy")
+    os.replace(prefix + ".tmp.json", prefix + ".json")
@@ -1,6 +1,8 @@
 (function () {
   const api = {
     chat: "/chat",
+    stream: "/chat/stream",
+    ws: "/ws",
   };
 
   const widget = document.getElementById("widget");
@@ -20,6 +22,7 @@
       chatEl.dataset.greeted = "1";
       addBot("Hi! I’m the Ortahaus Product Guide. Tell me your hair type and your main concern (e.g., volume, hold, frizz, or shine) and I’ll make a single, tailored recommendation.");
     }
+    connect(); // open the socket while the user types
     input.focus();
   }
 
@@ -45,27 +48,157 @@
     row.innerHTML = `<div class="bubble">${html}</div>`;
     chatEl.appendChild(row);
     chatEl.scrollTop = chatEl.scrollHeight;
+    return row.firstChild;
   }
 
   function escapeHtml(s) {
     return s.replace(/[&<>]/g, ch => ({'&':'&amp;','<':'&lt;','>':'&gt;'}[ch]));
   }
 
+  // Reads a text/event-stream body and calls onEvent(type, data) per event.
+  async function readEvents(res, onEvent) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buf = "";
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buf += decoder.decode(value, { stream: true });
+      let cut;
+      while ((cut = buf.indexOf("\n\n")) >= 0) {
+        const raw = buf.slice(0, cut);
+        buf = buf.slice(cut + 2);
+        let type = "message", data = "";
+        raw.split("\n").forEach(line => {
+          if (line.startsWith("event:")) type = line.slice(6).trim();
+          else if (line.startsWith("data:")) data += line.slice(5).trim();
+        });
+        if (data) onEvent(type, JSON.parse(data));
+      }
+    }
+  }
+
+  async function sendStreaming(text) {
+    const res = await fetch(api.stream, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ message: text, session_id: sessionId }),
+    });
+    if (!res.ok || !res.body || !res.body.getReader) throw new Error("no stream");
+    // show a bubble right away and fill it in as chunks arrive
+    const bubble = addBot("…");
+    let html = "";
+    try {
+      await readEvents(res, (type, data) => {
+        if (type === "delta") html += data.text;
+        else if (type === "done") html = data.reply || html;
+        bubble.innerHTML = html || "…";
+        chatEl.scrollTop = chatEl.scrollHeight;
+      });
+    } catch (e) {
+      // the server already has this message, so don't resend it over POST
+      if (!html) bubble.innerHTML = "Server error. Try again in a moment.";
+      return;
+    }
+    if (!html) bubble.innerHTML = "Hmm, I didn't catch that.";
+  }
+
+  // Persistent WebSocket: the server binds the session once per connection.
+  // Resolves to null when WebSockets are unavailable so callers fall back to HTTP.
+  // A failed handshake (e.g. a proxy that doesn't upgrade) is remembered for the
+  // rest of the page, so later turns go straight to SSE instead of retrying it.
+  let socket = null;
+  let socketFailed = false;
+  let connecting = null; // promise of the socket still being opened, shared by every caller
+  let pending = null; // handlers for the turn in flight
+  function connect() {
+    if (socket && socket.readyState === WebSocket.OPEN) return Promise.resolve(socket);
+    if (connecting) return connecting;
+    if (socketFailed || !("WebSocket" in window)) return Promise.resolve(null);
+    const opening = new Promise(resolve => {
+      const settle = ws => {
+        if (connecting === opening) connecting = null;
+        resolve(ws);
+      };
+      const proto = location.protocol === "https:" ? "wss:" : "ws:";
+      const ws = new WebSocket(`${proto}//${location.host}${api.ws}?session_id=${encodeURIComponent(sessionId)}`);
+      ws.onopen = () => { socket = ws; settle(ws); };
+      ws.onerror = () => {
+        if (socket !== ws) socketFailed = true; // never opened
+        settle(null);
+      };
+      ws.onclose = () => {
+        if (socket === ws) socket = null;
+        if (pending) { pending.fail(new Error("socket closed")); pending = null; }
+      };
+      ws.onmessage = e => { if (pending) pending.event(JSON.parse(e.data)); };
+    });
+    connecting = opening;
+    return opening;
+  }
+
+  async function sendSocket(text) {
+    const ws = await connect();
+    if (!ws) throw new Error("no socket");
+    return new Promise(resolve => {
+      let bubble = null;
+      let html = "";
+      pending = {
+        event(ev) {
+          if (!bubble) bubble = addBot("…");
+          if (ev.type === "delta") html += ev.text;
+          else if (ev.type === "done") html = ev.reply || html;
+          else if (ev.type === "error") html = "Hmm, I didn't catch that.";
+          bubble.innerHTML = html || "…";
+          chatEl.scrollTop = chatEl.scrollHeight;
+          if (ev.type === "done" || ev.type === "error") { pending = null; resolve(); }
+        },
+        fail() {
+          // the message may already be on the server, so don't resend it
+          if (bubble && !html) bubble.innerHTML = "Server error. Try again in a moment.";
+          else if (!bubble) addBot("Server error. Try again in a moment.");
+          resolve();
+        },
+      };
+      ws.send(JSON.stringify({ message: text }));
+    });
+  }
+
+  async function sendPlain(text) {
+    const res = await fetch(api.chat, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ message: text, session_id: sessionId }),
+    });
+    const data = await res.json();
+    addBot(data.reply || "Hmm, I didn't catch that.");
+  }
+
+  // One turn at a time: a second message would otherwise take over the
+  // socket's event handlers while the first reply is still arriving.
+  let busy = false;
   async function send() {
     const text = input.value.trim();
-    if (!text) return;
+    if (!text || busy) return;
+    busy = true;
+    sendBtn.disabled = true;
     addYou(text);
     input.value = "";
     try {
-      const res = await fetch(api.chat, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message: text, session_id: sessionId }),
-      });
-      const data = await res.json();
-      addBot(data.reply || "Hmm, I didn't catch that.");
+      await sendSocket(text);
     } catch (e) {
-      addBot("Server error. Try again in a moment.");
+      try {
+        await sendStreaming(text);
+      } catch (e2) {
+        try {
+          await sendPlain(text);
+        } catch (e3) {
+          addBot("Server error. Try again in a moment.");
+        }
+      }
+    } finally {
+      busy = false;
+      sendBtn.disabled = false;
     }
   }
 